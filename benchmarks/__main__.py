@@ -0,0 +1,139 @@
+# encoding: utf-8
+"""
+Benchmark runner,
+    results as JSON, one object per run, to compare across commits.
+
+    $ python -m benchmarks [--mode inproc|e2e] [--tree wide,deep,param]
+                           [--variant plain,compiled] [-n 20000]
+                           [--native] [--loop asyncio,uvloop]
+                           [--output result.json] [--compare base.json]
+
+    the other benchmarks run the same way, from the repository root,
+        eg: python -m benchmarks.dispatch
+"""
+
+from argparse import ArgumentParser
+from subprocess import check_output, CalledProcessError
+import platform
+import json
+import sys
+import os
+
+from .suite import TREES, inproc, e2e
+
+
+KEYS = ('rps', 'p50_us', 'p99_us', 'alloc_peak_bytes')
+
+
+def commit():
+    try:
+        return check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).decode().strip()
+    except (OSError, CalledProcessError):
+        return None
+
+
+def installed(name):
+    try:
+        __import__(name)
+    except ImportError:
+        return False
+    return True
+
+
+def label(result):
+    return "{:6} {:9} {:8}".format(
+        result['tree'], result['variant'], result.get('loop') or "-"
+    )
+
+
+def compare(base, run):
+    """
+    Relative change of each result to the base run.
+    """
+    index = {
+        (r['tree'], r['variant'], r.get('loop')): r for r in base['results']
+    }
+    for result in run['results']:
+        old = index.get(
+            (result['tree'], result['variant'], result.get('loop'))
+        )
+        if old is None:
+            continue
+        changes = " ".join(
+            "{} {:+.1%}".format(key, result[key] / old[key] - 1)
+            for key in KEYS
+            if old.get(key) and result.get(key) is not None
+        )
+        print("{} {}".format(label(result), changes), file=sys.stderr)
+
+
+def main(argv=None):
+    parser = ArgumentParser(prog="python -m benchmarks")
+    parser.add_argument('--mode', choices=('inproc', 'e2e'), default='inproc')
+    parser.add_argument('--tree', default=",".join(sorted(TREES)))
+    parser.add_argument('--variant', default="plain,compiled")
+    parser.add_argument('-n', type=int, default=20000,
+                        help="requests per tree, inproc mode.")
+    parser.add_argument('--seconds', type=float, default=5,
+                        help="duration per tree, e2e mode.")
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--native', action='store_true',
+                        help="e2e server on the native protocol.")
+    parser.add_argument('--loop', default="asyncio",
+                        help="e2e server event loops, eg: asyncio,uvloop, "
+                             "not installed ones are skipped.")
+    parser.add_argument('--output', default=None)
+    parser.add_argument('--compare', default=None)
+    args = parser.parse_args(argv)
+
+    run = {
+        'commit': commit(),
+        'python': platform.python_version(),
+        'mode': args.mode,
+        'results': []
+    }
+    loops = [None]
+    if args.mode == 'e2e':
+        loops = []
+        for name in args.loop.split(","):
+            if name == 'asyncio' or installed(name):
+                loops.append(name)
+            else:
+                print("{:8} skipped, not installed".format(name),
+                      file=sys.stderr)
+
+    for tree in args.tree.split(","):
+        for variant in args.variant.split(","):
+            for loop in loops:
+                if loop is None:
+                    result = inproc(tree, variant, args.n)
+                else:
+                    result = e2e(
+                        tree, variant, args.seconds, args.concurrency,
+                        native=args.native,
+                        loop=None if loop == 'asyncio' else loop
+                    )
+                result.update(tree=tree, variant=variant, loop=loop)
+                run['results'].append(result)
+                print("{} {:8.0f} req/s p50 {:.1f}us p99 {:.1f}us".format(
+                    label(result), result['rps'],
+                    result['p50_us'], result['p99_us']
+                ), file=sys.stderr)
+
+    output = json.dumps(run, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as fd:
+            fd.write(output)
+    else:
+        print(output)
+
+    if args.compare:
+        with open(args.compare) as fd:
+            compare(json.load(fd), run)
+
+
+if __name__ == '__main__':
+    main()
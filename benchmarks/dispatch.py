@@ -0,0 +1,133 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+Handle dispatch benchmark.
+    sync handles, called directly,
+    against native coroutine and generator (compat) handles.
+    `--base` runs the same handles on the isperdal of another revision,
+    eg: the one before the async/await migration, and prints the change.
+
+    $ python -m benchmarks.dispatch [n] [--base 41b2d9e^]
+"""
+
+from argparse import ArgumentParser
+from asyncio import get_event_loop
+from subprocess import check_output
+from tempfile import mkdtemp
+from timeit import default_timer
+from shutil import copytree, rmtree
+from io import BytesIO
+import tarfile
+import json
+import sys
+import os
+
+from isperdal import Node as u
+from isperdal.request import Request
+from isperdal.response import Response
+
+
+def sync():
+    def nothing(this, req, res):
+        pass
+
+    def index(this, req, res):
+        return res.push("INDEX").ok()
+    return nothing, index
+
+
+def native():
+    async def nothing(this, req, res):
+        pass
+
+    async def index(this, req, res):
+        return res.push("INDEX").ok()
+    return nothing, index
+
+
+def generator():
+    def nothing(this, req, res):
+        yield from ()
+
+    def index(this, req, res):
+        yield from ()
+        return res.push("INDEX").ok()
+    return nothing, index
+
+
+def app(handles):
+    nothing, index = handles()
+    return u('/').all()(nothing, nothing).get(u('index'))(index)
+
+
+def measure(root, n, repeat=5):
+    """
+    Best of `repeat` runs, us per request.
+    """
+    loop = get_event_loop()
+    env = {'REQUEST_METHOD': "GET", 'PATH_INFO': "/index"}
+    start_response = (lambda status, headers: None)
+
+    async def run():
+        for _ in range(n):
+            await root.serve(Request(env), Response(start_response))
+
+    best = None
+    for _ in range(repeat):
+        start = default_timer()
+        loop.run_until_complete(run())
+        elapsed = default_timer() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best / n * 1e6
+
+
+def base(rev, n):
+    """
+    Results of these handles on the isperdal of `rev`,
+        in a subprocess, the package exported with `git archive`.
+    """
+    here = os.path.dirname(os.path.abspath(__file__))
+    path = mkdtemp()
+    try:
+        archive = check_output(
+            ['git', 'archive', rev, 'isperdal'], cwd=os.path.dirname(here)
+        )
+        with tarfile.open(fileobj=BytesIO(archive)) as tar:
+            tar.extractall(path)
+        copytree(here, os.path.join(path, 'benchmarks'))
+        return json.loads(check_output(
+            [sys.executable, '-m', 'benchmarks.dispatch', str(n), '--json'],
+            cwd=path
+        ).decode())
+    finally:
+        rmtree(path)
+
+
+def main(argv=None):
+    parser = ArgumentParser(prog="python -m benchmarks.dispatch")
+    parser.add_argument('n', type=int, nargs='?', default=20000)
+    parser.add_argument('--base', default=None,
+                        help="git revision to compare with.")
+    parser.add_argument('--json', action='store_true')
+    args = parser.parse_args(argv)
+
+    results = [
+        (handles.__name__, measure(app(handles), args.n))
+        for handles in (sync, native, generator)
+    ]
+    if args.json:
+        print(json.dumps(dict(results)))
+        return
+
+    old = base(args.base, args.n) if args.base else {}
+    for name, us in results:
+        line = "{:10} {:8.2f} us/request".format(name, us)
+        if name in old:
+            line += "  base {:8.2f} us/request {:+.1%}".format(
+                old[name], us / old[name] - 1
+            )
+        print(line)
+
+
+if __name__ == '__main__':
+    main()
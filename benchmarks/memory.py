@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+Request/Response memory and allocation benchmark.
+    slotted classes against dict-based copies of them,
+    with the per-request `MethodType` mounting the cookie middleware did.
+
+    $ python -m benchmarks.memory [n]
+"""
+
+from types import MethodType
+from timeit import default_timer
+import tracemalloc
+import gc
+import sys
+
+from isperdal.request import Request
+from isperdal.response import Response
+from isperdal.middleware.cookie import cookie
+
+
+def unslotted(cls):
+    """
+    Copy of a slotted class, with per-instance `__dict__`.
+    """
+    return type(
+        "Dict{}".format(cls.__name__),
+        (object,),
+        {
+            k: v for k, v in vars(cls).items()
+            if k not in cls.__slots__ and k not in ('__slots__', '__dict__')
+        }
+    )
+
+
+DictRequest, DictResponse = unslotted(Request), unslotted(Response)
+
+
+def env(i):
+    return {
+        'REQUEST_METHOD': "GET",
+        'PATH_INFO': "/user/{}".format(i),
+        'QUERY_STRING': "",
+        'HTTP_COOKIE': "session=abc"
+    }
+
+
+def new(req_cls, res_cls, mounted):
+    def new_pair(env):
+        req, res = req_cls(env), res_cls(print)
+        if mounted:
+            # the per-request closures of the old cookie middleware.
+            for name in ('cookies', 'cookie'):
+                setattr(req, name, MethodType(lambda self: None, req))
+            res.cookie = MethodType(lambda self: None, res)
+            res.hooks.append(lambda res: None)
+        else:
+            cookie(None, req, res)
+        return req, res
+    return new_pair
+
+
+def measure(name, new_pair, n):
+    envs = [env(i) for i in range(n)]
+
+    gc.collect()
+    tracemalloc.start()
+    pairs = [new_pair(e) for e in envs]
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del pairs
+
+    gc.collect()
+    collections = sum(s['collections'] for s in gc.get_stats())
+    start = default_timer()
+    for e in envs:
+        new_pair(e)
+    elapsed = default_timer() - start
+    collections = sum(s['collections'] for s in gc.get_stats()) - collections
+
+    print("{:8} {:8.0f} B/request {:8.2f} us/request {:6} gc".format(
+        name, size / n, elapsed / n * 1e6, collections
+    ))
+
+
+def main(n=20000):
+    measure("dict", new(DictRequest, DictResponse, True), n)
+    measure("slots", new(Request, Response, False), n)
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
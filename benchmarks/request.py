@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+Request param parsing benchmark.
+    counts parses per request, each source must be parsed at most once.
+
+    $ python -m benchmarks.request
+"""
+
+from asyncio import get_event_loop
+from collections import Counter
+from io import BytesIO
+from timeit import default_timer
+from importlib import import_module
+import sys
+
+from isperdal import request
+from isperdal.request import Request
+from isperdal.response import Response
+
+cookie = import_module('isperdal.middleware.cookie')
+
+
+class StreamIO():
+    def __init__(self, buffer=b''):
+        self.buffer = BytesIO(buffer)
+
+    async def read(self, size=-1):
+        return self.buffer.read(size)
+
+
+def counted(counter, name, fn):
+    def counted_fn(*args, **kwargs):
+        counter[name] += 1
+        return fn(*args, **kwargs)
+    return counted_fn
+
+
+def environ():
+    return {
+        'REQUEST_METHOD': "POST",
+        'PATH_INFO': "/user/42",
+        'QUERY_STRING': "page=2&sort=name&tag=a&tag=b",
+        'CONTENT_TYPE': "application/x-www-form-urlencoded",
+        'CONTENT_LENGTH': "22",
+        'HTTP_COOKIE': "session=abc; theme=dark",
+        'wsgi.input': StreamIO(b"name=foo&email=a%40b.c")
+    }
+
+
+async def handle(req):
+    cookie.cookie(None, req, Response(lambda *_: None))
+    req._rest['id'] = "42"
+    for name in ('id', 'page', 'sort', 'tag', 'name', 'email', 'none'):
+        await req.parm(name)
+        await req.parm(name)
+    for name in ('session', 'theme'):
+        await req.cookie(name)
+
+
+def main(n=10000):
+    loop = get_event_loop()
+    counter = Counter()
+    request.parse_qs = counted(counter, 'query', request.parse_qs)
+    request.parse_urlencoded = counted(
+        counter, 'form', request.parse_urlencoded
+    )
+    cookie.SimpleCookie = counted(counter, 'cookie', cookie.SimpleCookie)
+    request.unquote_plus = counted(counter, 'rest', request.unquote_plus)
+
+    loop.run_until_complete(handle(Request(environ())))
+    print("parses per request: {}".format(dict(counter)))
+    assert all(count == 1 for count in counter.values())
+
+    envs = [environ() for _ in range(n)]
+    start = default_timer()
+    for env in envs:
+        loop.run_until_complete(handle(Request(env)))
+    elapsed = default_timer() - start
+    print("{} requests, {:.1f} us/request".format(n, elapsed / n * 1e6))
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
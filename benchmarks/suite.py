@@ -0,0 +1,280 @@
+# encoding: utf-8
+"""
+Benchmark suite,
+    synthetic route trees and requests, driven in process or end to end.
+"""
+
+from asyncio import get_event_loop, open_connection, sleep, gather
+from multiprocessing import Process
+from time import perf_counter
+from socket import socket
+import tracemalloc
+import gc
+
+from isperdal import Node as u
+
+
+def index(this, req, res):
+    return res.push("INDEX").ok()
+
+
+def nothing(this, req, res):
+    pass
+
+
+async def params(this, req, res):
+    return res.push("{} {}".format(
+        await req.rest('id'), await req.query('page')
+    )).ok()
+
+
+def wide(width=200):
+    """
+    Many static siblings under the root.
+
+    - <tuple>       (root, paths)
+    """
+    root = u('/')
+    for i in range(width):
+        root.append([u('r{}/'.format(i)), u('index')])(index)
+    return root, [
+        "/r{}/index".format(i) for i in range(0, width, max(width // 20, 1))
+    ]
+
+
+def deep(depth=16):
+    """
+    One long static chain, a middleware and a sibling on each level.
+
+    - <tuple>       (root, paths)
+    """
+    root = node = u('/')
+    for i in range(depth):
+        node.then(u('x{}/'.format(i)))
+        node = node.then(u('d{}/'.format(i))).all()(nothing)
+    node.get(u('leaf'))(index)
+    return root, [
+        "/" + "".join("d{}/".format(i) for i in range(depth)) + "leaf"
+    ]
+
+
+def param(width=20):
+    """
+    `:param` and `:!rest` routes, behind static siblings.
+
+    - <tuple>       (root, paths)
+    """
+    root = u('/')
+    for i in range(width):
+        root.append([u('users/'), u('s{}'.format(i))])(index)
+    root.append([u('users/'), u(':id/'), u('posts/'), u(':pid')])(params)
+    root.append([u('users/'), u(':id')])(params)
+    root.append([u('files/'), u(':!path')])(params)
+    return root, [
+        "/users/{}/posts/{}?page=2".format(i, i * 7) for i in range(10)
+    ] + [
+        "/users/{}?page=1".format(i) for i in range(5)
+    ] + [
+        "/files/img/{}/a.png".format(i) for i in range(5)
+    ]
+
+
+TREES = {'wide': wide, 'deep': deep, 'param': param}
+
+
+def build(tree, variant):
+    """
+    Build a tree,
+        `compiled` variant has route index and LRU enabled.
+
+    - <tuple>       (root, paths)
+    """
+    root, paths = TREES[tree]()
+    if variant == 'compiled':
+        root.compile().memoize()
+    return root, paths
+
+
+def environ(uri, method="GET"):
+    """
+    Synthetic WSGI environ, with usual browser headers.
+    """
+    path, _, query = uri.partition('?')
+    return {
+        'REQUEST_METHOD': method,
+        'RAW_URI': uri,
+        'PATH_INFO': path,
+        'QUERY_STRING': query,
+        'SERVER_PROTOCOL': "HTTP/1.1",
+        'HTTP_HOST': "localhost",
+        'HTTP_USER_AGENT': "isperdal-bench",
+        'HTTP_ACCEPT': "text/html,application/xhtml+xml,*/*;q=0.8",
+        'HTTP_ACCEPT_ENCODING': "gzip, deflate",
+        'HTTP_COOKIE': "session=abc; theme=dark"
+    }
+
+
+def percentile(latencies, q):
+    """
+    + latencies<list>   sorted.
+    + q<float>          0 ~ 1.
+    """
+    return latencies[min(int(q * len(latencies)), len(latencies) - 1)]
+
+
+def summary(latencies, elapsed):
+    latencies.sort()
+    return {
+        'requests': len(latencies),
+        'rps': len(latencies) / elapsed,
+        'p50_us': percentile(latencies, 0.5) * 1e6,
+        'p99_us': percentile(latencies, 0.99) * 1e6
+    }
+
+
+def start_response(status, headers):
+    pass
+
+
+async def drive(root, envs, n):
+    latencies = []
+    for i in range(n):
+        start = perf_counter()
+        body = await root(envs[i % len(envs)], start_response)
+        b"".join(body)
+        latencies.append(perf_counter() - start)
+    return latencies
+
+
+def inproc(tree, variant, n=20000, warmup=1000):
+    """
+    Drive `Node.__call__` with synthetic environs.
+        1. latency and req/s, after warmup.
+        2. allocations, under tracemalloc in a separate pass,
+            peak is the working set of n requests in flight one by one,
+            retained is what outlives them.
+
+    - <dict>
+    """
+    loop = get_event_loop()
+    root, paths = build(tree, variant)
+    envs = [environ(path) for path in paths]
+
+    loop.run_until_complete(drive(root, envs, warmup))
+    gc.collect()
+    start = perf_counter()
+    latencies = loop.run_until_complete(drive(root, envs, n))
+    result = summary(latencies, perf_counter() - start)
+
+    m = max(n // 10, 1)
+    gc.collect()
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    loop.run_until_complete(drive(root, envs, m))
+    gc.collect()
+    after, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    result.update({
+        'alloc_peak_bytes': peak - before,
+        'alloc_retained_bytes_per_request': (after - before) / m
+    })
+    return result
+
+
+def free_port():
+    with socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def serve(tree, variant, port, options):
+    root, _ = build(tree, variant)
+    root.run(port=port, debug=False, **options)
+
+
+async def ready(port, timeout=10):
+    loop = get_event_loop()
+    deadline = loop.time() + timeout
+    while True:
+        try:
+            _, writer = await open_connection('127.0.0.1', port)
+        except OSError:
+            if loop.time() > deadline:
+                raise
+            await sleep(0.05)
+        else:
+            writer.close()
+            return
+
+
+async def client(port, requests, deadline, offset):
+    """
+    Keep-alive client, one request in flight.
+
+    - <list>        latencies.
+    """
+    reader, writer = await open_connection('127.0.0.1', port)
+    loop = get_event_loop()
+    latencies = []
+    try:
+        while loop.time() < deadline:
+            request = requests[(offset + len(latencies)) % len(requests)]
+            start = perf_counter()
+            writer.write(request)
+            length = 0
+            while True:
+                line = await reader.readline()
+                if not line:
+                    return latencies
+                if line == b"\r\n":
+                    break
+                name, _, value = line.partition(b":")
+                if name.strip().lower() == b"content-length":
+                    length = int(value)
+            await reader.readexactly(length)
+            latencies.append(perf_counter() - start)
+    finally:
+        writer.close()
+    return latencies
+
+
+async def load(port, paths, seconds, concurrency):
+    await ready(port)
+    requests = [
+        "GET {} HTTP/1.1\r\nHost: localhost\r\n\r\n".format(path).encode()
+        for path in paths
+    ]
+    start = perf_counter()
+    deadline = get_event_loop().time() + seconds
+    latencies = await gather(*(
+        client(port, requests, deadline, i) for i in range(concurrency)
+    ))
+    return (
+        [latency for part in latencies for latency in part],
+        perf_counter() - start
+    )
+
+
+def e2e(tree, variant, seconds=5, concurrency=32, **options):
+    """
+    Drive a local server, forked, over keep-alive connections.
+
+    + **options         `Node.run` options, eg: native=True, loop='uvloop'
+
+    - <dict>
+    """
+    _, paths = build(tree, variant)
+    port = free_port()
+    server = Process(
+        target=serve, args=(tree, variant, port, options), daemon=True
+    )
+    server.start()
+    try:
+        latencies, elapsed = get_event_loop().run_until_complete(
+            load(port, paths, seconds, concurrency)
+        )
+    finally:
+        server.terminate()
+        server.join()
+    return summary(latencies, elapsed)
@@ -1,4 +1,2 @@
-from asyncio import iscoroutinefunction, coroutine
-
 from .node import Node
 from .websocket import WebSocket
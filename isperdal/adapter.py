@@ -1,61 +1,498 @@
-from asyncio import get_event_loop
+from asyncio import get_event_loop, new_event_loop, set_event_loop, sleep
+from asyncio import AbstractEventLoop
+from inspect import isawaitable
 from ssl import SSLContext
+from socket import getaddrinfo, socket, SOCK_STREAM, AI_PASSIVE
+from socket import SOL_SOCKET, SO_REUSEADDR
+from signal import signal, SIGTERM, SIGINT, SIGHUP, SIG_DFL
+from time import time, sleep as pause
+from collections import OrderedDict
+from traceback import print_exc
+import os
 
+from aiohttp import Response as HTTPResponse
+from aiohttp.server import ServerHttpProtocol
 from aiohttp.wsgi import WSGIServerHttpProtocol
 from aiohttp.websocket import do_handshake
 
+from .request import Request
+from .response import Response, Stream
+from .utils import awaited
+
 from ssl import PROTOCOL_TLSv1_2 as PROTOCOL
 
 
-class AioWSGIServerProtocol(WSGIServerHttpProtocol):
+class Connections(object):
+    """
+    Open connections of the server.
+        beyond `limit`, new connections are paused
+        until a slot frees, up to `queue` of them for `wait` seconds,
+        the others are closed.
+    """
+
+    def __init__(self, limit=0, queue=None, wait=30):
+        """
+        + limit<int>        active connections, 0 unlimited.
+        + queue<int>        paused connections, None for `limit`.
+        + wait<float>       seconds a paused connection waits.
+        """
+        self.limit = limit
+        self.queue = limit if queue is None else queue
+        self.wait = wait
+        self.active = set()
+        self.waiting = OrderedDict()
+
+    def __len__(self):
+        return len(self.active) + len(self.waiting)
+
+    def __iter__(self):
+        return iter(list(self.active) + list(self.waiting))
+
+    def add(self, protocol):
+        if not self.limit or len(self.active) < self.limit:
+            self.active.add(protocol)
+        elif len(self.waiting) < self.queue:
+            protocol.transport.pause_reading()
+            self.waiting[protocol] = get_event_loop().call_later(
+                self.wait, self.reap, protocol
+            )
+        else:
+            protocol.transport.close()
+
+    def reap(self, protocol):
+        if self.waiting.pop(protocol, None) is not None:
+            protocol.transport.close()
+
+    def discard(self, protocol):
+        if protocol in self.active:
+            self.active.discard(protocol)
+            while self.waiting:
+                protocol, timer = self.waiting.popitem(last=False)
+                timer.cancel()
+                if protocol.transport is not None:
+                    self.active.add(protocol)
+                    protocol.transport.resume_reading()
+                    break
+        else:
+            timer = self.waiting.pop(protocol, None)
+            if timer is not None:
+                timer.cancel()
+
+
+class AioProtocolMixin(object):
+    """
+    Connection policy of the server.
+        1. track open connections.
+        2. close connection after `max_requests` requests.
+    """
+
+    def __init__(self, *args, connections, max_requests=0, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.connections = connections
+        self.max_requests = max_requests
+        self.requests = 0
+
+    def connection_made(self, transport):
+        super().connection_made(transport)
+        self.connections.add(self)
+
+    def connection_lost(self, exc):
+        self.connections.discard(self)
+        super().connection_lost(exc)
+
+    async def handle_request(self, message, payload):
+        self.requests += 1
+        if self.max_requests and self.requests >= self.max_requests:
+            message = message._replace(should_close=True)
+        await self.respond(message, payload)
+
+    async def respond(self, message, payload):
+        await super().handle_request(message, payload)
+
+
+def handshake(message, transport, reader):
+    """
+    Websocket handshake.
+
+    - <dict>        websocket env.
+    """
+    status, headers, parser, writer, protocol = do_handshake(
+        message.method, message.headers, transport
+    )
+    return {
+        'websocket': True,
+        'websocket.status': status,
+        'websocket.headers': headers,
+        'websocket.reader': reader,
+        'websocket.writer': writer,
+        'websocket.parser': parser,
+        'websocket.protocol': protocol
+    }
+
+
+async def write(response, body):
+    """
+    Write body chunks, wait while the transport is paused.
+        &asyncio
+
+    + response          aiohttp Response, headers started.
+    + body              iterable, items are bytes or awaitables of them.
+    """
+    for chunk in body:
+        if isawaitable(chunk):
+            chunk = await chunk
+        # returns () if there's nothing to drain.
+        await awaited(response.write(chunk, drain=True))
+
+
+class AioWSGIServerProtocol(AioProtocolMixin, WSGIServerHttpProtocol):
+    async def respond(self, message, payload):
+        # as `WSGIServerHttpProtocol.handle_request`, but drained.
+        now = self._loop.time()
+        environ = self.create_wsgi_environ(message, payload)
+        response = self.create_wsgi_response(message)
+
+        body = self.wsgi(environ, response.start_response)
+        if isawaitable(body):
+            body = await body
+        try:
+            await write(response.response, body)
+            await awaited(response.response.write_eof())
+        finally:
+            if hasattr(body, 'close'):
+                body.close()
+
+        if response.response.keep_alive():
+            self.keep_alive(True)
+
+        self.log_access(
+            message, environ, response.response, self._loop.time() - now
+        )
+
     def create_wsgi_environ(self, message, payload):
         environ = super().create_wsgi_environ(message, payload)
+        # raw headers, multi-valued ones are not joined.
+        environ['isperdal.headers'] = message.headers
 
         if 'websocket' in message.headers.get('UPGRADE', '').lower():
-            # websocket handshake
-            status, headers, parser, writer, protocol = do_handshake(
-                message.method, message.headers, self.transport
-            )
-            environ['websocket'] = True
-            environ['websocket.status'] = status
-            environ['websocket.headers'] = headers
-            environ['websocket.reader'] = self.reader
-            environ['websocket.writer'] = writer
-            environ['websocket.parser'] = parser
-            environ['websocket.protocol'] = protocol
+            environ.update(handshake(message, self.transport, self.reader))
 
         return environ
 
 
+class AioHTTPServerProtocol(AioProtocolMixin, ServerHttpProtocol):
+    """
+    Native protocol,
+        build Request and Response from the parsed message,
+        and write to the transport, without WSGI env.
+    """
+
+    def __init__(self, node, *args, is_ssl=False, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.node = node
+        self.is_ssl = is_ssl
+
+    async def respond(self, message, payload):
+        peername = self.transport.get_extra_info('peername') or ("",)
+        env = {
+            'REMOTE_ADDR': peername[0],
+            'wsgi.url_scheme': message.headers.get(
+                'X-FORWARDED-PROTO', 'https' if self.is_ssl else 'http'
+            )
+        }
+        if 'websocket' in message.headers.get('UPGRADE', '').lower():
+            env.update(handshake(message, self.transport, self.reader))
+
+        response = None
+
+        def start_response(status, headers):
+            nonlocal response
+            response = HTTPResponse(
+                self.writer, int(status.split(' ', 1)[0]),
+                message.version, message.should_close
+            )
+            response.add_headers(*headers)
+            response.send_headers()
+
+        body = await self.node.serve(
+            Request.from_message(message, payload, env),
+            Response(start_response)
+        )
+
+        if response is not None:
+            if isinstance(body, Stream):
+                # sendfile, or chunks drained when the transport is paused.
+                sent = await body.sendfile(self.writer, self._loop)
+                while not sent:
+                    chunk = await body.read()
+                    if chunk is None:
+                        break
+                    await awaited(response.write(chunk, drain=True))
+            else:
+                await write(response, body)
+            await awaited(response.write_eof())
+
+            if response.keep_alive():
+                self.keep_alive(True)
+
+
 class AioHTTPServer(object):
-    def __init__(self, host, port, debug, ssl):
+    def __init__(
+        self, host, port, debug, ssl, workers=1, grace=15, native=False,
+        keep_alive=75, timeout=0, max_requests=0, max_connections=0,
+        loop=None, monitor=None
+    ):
+        """
+        init server.
+
+        + workers<int>          number of pre-forked worker process.
+        + grace<int>            seconds to wait connections on shutdown.
+        + native<bool>          native protocol, or WSGI compatibility mode.
+        + keep_alive<int>       seconds to reap idle keep-alive connection.
+        + timeout<int>          seconds to reap slow request, 0 disable.
+        + max_requests<int>     requests per connection, 0 unlimited.
+        + max_connections<int>  active connections per worker, 0 unlimited.
+            as many more wait, paused, up to `keep_alive` seconds,
+            the others are closed.
+        + loop                  event loop,
+            None, stdlib loop.
+            'uvloop', uvloop if installed.
+            <fn>, loop factory, called in each worker.
+            <AbstractEventLoop>, caller's loop, single worker only.
+        + monitor               `isperdal.monitor.Monitor`, started on
+            the loop of each worker.
+        """
         self.host = host
         self.port = port
         self.debug = debug
+        self.workers = workers
+        self.grace = grace
+        self.native = native
+        self.keep_alive = keep_alive
+        self.timeout = timeout
+        self.max_requests = max_requests
+        self.max_connections = max_connections
+        self.alive = True
+
+        if loop == 'uvloop':
+            from uvloop import new_event_loop as loop
+        if isinstance(loop, AbstractEventLoop) and workers > 1:
+            raise ValueError("A loop can't be shared by workers, use factory.")
+        self.loop = loop
+        self.monitor = monitor
+
         if ssl:
             self.ssl = SSLContext(PROTOCOL)
             self.ssl.load_cert_chain(*ssl)
         else:
             self.ssl = None
 
-    def run(self, handler):
-        loop = get_event_loop()
+    def protocol(self, node, connections):
+        options = {
+            'debug': self.debug,
+            'keep_alive': self.keep_alive,
+            'timeout': self.timeout,
+            'max_requests': self.max_requests,
+            'is_ssl': bool(self.ssl),
+            'connections': connections
+        }
+        if self.native:
+            return lambda: AioHTTPServerProtocol(node, **options)
+        return lambda: AioWSGIServerProtocol(
+            node,
+            readpayload=False,
+            **options
+        )
+
+    def event_loop(self, fresh=False):
+        """
+        Event loop of this process.
 
-        loop.run_until_complete(
-            loop.create_server(
-                lambda: AioWSGIServerProtocol(
-                    handler,
-                    readpayload=False,
-                    debug=self.debug,
-                    is_ssl=bool(self.ssl)
-                ),
-                self.host,
-                self.port,
-                ssl=self.ssl
+        + fresh<bool>       new stdlib loop, eg: in forked worker.
+
+        - <AbstractEventLoop>
+        """
+        if isinstance(self.loop, AbstractEventLoop):
+            loop = self.loop
+        elif self.loop is not None:
+            loop = self.loop()
+        elif fresh:
+            loop = new_event_loop()
+        else:
+            return get_event_loop()
+        set_event_loop(loop)
+        return loop
+
+    async def start(self, node, sock=None):
+        """
+        Start serving on the running loop,
+            eg: embedded in an application.
+            &asyncio
+
+        + node              root node.
+        + sock<socket>      listening socket.
+
+        - <tuple>           (server, connections)
+        """
+        connections = Connections(
+            self.max_connections, wait=self.keep_alive or 30
+        )
+        server = await get_event_loop().create_server(
+            self.protocol(node, connections),
+            ssl=self.ssl,
+            **(
+                {'host': self.host, 'port': self.port}
+                if sock is None else
+                {'sock': sock}
             )
         )
+        if self.monitor is not None:
+            self.monitor.start()
+        return server, connections
+
+    async def close(self, server, connections):
+        """
+        Stop accepting, then wait open connections for `grace` seconds.
+            &asyncio
+        """
+        server.close()
+        if self.monitor is not None:
+            self.monitor.stop()
+        for protocol in list(connections):
+            protocol.closing()
+
+        loop = get_event_loop()
+        deadline = loop.time() + self.grace
+        while connections and loop.time() < deadline:
+            await sleep(0.1)
+
+    async def shutdown(self, loop, server, connections):
+        await self.close(server, connections)
+        loop.stop()
+
+    def serve(self, node, sock=None):
+        """
+        Run server in this process.
+
+        + node              root node.
+        + sock<socket>      inherited listening socket.
+        """
+        loop = self.event_loop(fresh=sock is not None)
+        server, connections = loop.run_until_complete(self.start(node, sock))
+
+        for signum in (SIGTERM, SIGINT):
+            loop.add_signal_handler(
+                signum,
+                lambda: loop.create_task(
+                    self.shutdown(loop, server, connections)
+                )
+            )
 
         try:
             loop.run_forever()
         except KeyboardInterrupt:
             loop.stop()
+        finally:
+            for signum in (SIGTERM, SIGINT):
+                loop.remove_signal_handler(signum)
+
+    def listen(self):
+        """
+        Create listening socket, shared by workers.
+
+        - <socket>
+        """
+        family, kind, proto, _, address = getaddrinfo(
+            self.host, self.port, type=SOCK_STREAM, flags=AI_PASSIVE
+        )[0]
+        sock = socket(family, kind, proto)
+        sock.setsockopt(SOL_SOCKET, SO_REUSEADDR, 1)
+        sock.bind(address)
+        sock.listen(128)
+        sock.setblocking(False)
+        return sock
+
+    def work(self, node, sock):
+        """
+        Serve in a forked worker.
+
+        - <int>         exit status, non-zero if serve raised.
+        """
+        try:
+            self.serve(node, sock)
+        except BaseException:
+            print_exc()
+            return 1
+        return 0
+
+    def prefork(self, node):
+        """
+        Pre-fork workers sharing the listening socket.
+            1. SIGTERM/SIGINT stop all workers.
+            2. SIGHUP starts new workers, then stops the old ones.
+            3. crashed workers are respawned.
+        """
+        sock = self.listen()
+        workers = {}
+        retired = set()
+
+        def spawn():
+            pid = os.fork()
+            if pid == 0:
+                status = 1
+                try:
+                    for signum in (SIGTERM, SIGINT, SIGHUP):
+                        signal(signum, SIG_DFL)
+                    status = self.work(node, sock)
+                finally:
+                    os._exit(status)
+            workers[pid] = time()
+
+        def stop(signum, frame):
+            self.alive = False
+            for pid in workers:
+                os.kill(pid, SIGTERM)
+
+        def restart(signum, frame):
+            old = list(workers)
+            for _ in range(self.workers):
+                spawn()
+            for pid in old:
+                retired.add(pid)
+                os.kill(pid, SIGTERM)
+
+        signal(SIGTERM, stop)
+        signal(SIGINT, stop)
+        signal(SIGHUP, restart)
+
+        for _ in range(self.workers):
+            spawn()
+
+        while workers:
+            try:
+                pid, status = os.wait()
+            except ChildProcessError:
+                break
+            except InterruptedError:
+                continue
+
+            started = workers.pop(pid, None)
+            if pid in retired:
+                retired.discard(pid)
+            elif self.alive and started is not None:
+                if status:
+                    print("worker {} exited with status {:#x}".format(
+                        pid, status
+                    ))
+                if time() - started < 1:
+                    # crashed on startup, don't spin.
+                    pause(1)
+                spawn()
+
+        sock.close()
+
+    def run(self, node):
+        if self.workers > 1:
+            self.prefork(node)
+        else:
+            self.serve(node)
@@ -0,0 +1,180 @@
+from asyncio import get_event_loop, wait_for, shield, TimeoutError
+from functools import partial
+from time import monotonic
+
+from .utils import LRU
+
+
+def directives(value):
+    """
+    >>> sorted(directives("no-store, Max-Age=60"))
+    ['max-age', 'no-store']
+    >>> directives(None)
+    set()
+    """
+    return {
+        item.split('=', 1)[0].strip().lower()
+        for item in (value or "").split(',')
+    } - {""}
+
+
+class Entry(object):
+    """
+    Cached response.
+    """
+
+    __slots__ = (
+        'expires', 'status_code', 'status_text', 'headers', 'body', 'size'
+    )
+
+    def __init__(self, res, ttl):
+        self.expires = monotonic() + ttl
+        self.status_code = res.status_code
+        self.status_text = res.status_text
+        self.headers = dict(res.headers)
+        self.body = tuple(res.body)
+        self.size = sum(map(len, self.body)) + sum(
+            len(k) + len(str(v)) for k, v in self.headers.items()
+        )
+
+    def replay(self, res):
+        res.status(self.status_code, self.status_text)
+        res.headers.update(self.headers)
+        for chunk in self.body:
+            res.push(chunk)
+        return res.ok()
+
+
+class ResponseCache(object):
+    """
+    Response cache middleware,
+        add it as the first handle of a node, caches the subtree.
+        1. keyed on method, path, and the selected query params and headers.
+        2. stores status, headers and pushed body segments,
+            streams, empty and `ok(T)` bodies are not cached,
+            nor responses with Set-Cookie, or no-store or private.
+        3. requests with Authorization, or no-store, bypass it.
+        4. entries expire after `ttl`, least recently used
+            are evicted past `max_bytes`.
+        5. concurrent misses of a key run the handles once,
+            the others wait for it, up to `wait` seconds.
+
+    eg:
+        cache = ResponseCache(ttl=300, query=('page',))
+        app.then(u('posts/')).all()(cache)
+        ...
+        cache.invalidate(prefix="/posts/")
+    """
+
+    def __init__(
+        self, ttl=60, max_bytes=1 << 24, query=None, headers=(),
+        methods=('GET', 'HEAD'), statuses=(200,), wait=10
+    ):
+        """
+        + ttl<float>            seconds an entry lives.
+        + max_bytes<int>        max bytes of bodies and headers.
+        + query<tuple>          query params in key, None for all of them.
+        + headers<tuple>        request headers in key, eg: Accept-Encoding.
+        + methods<tuple>        cacheable methods.
+        + statuses<tuple>       cacheable status codes.
+        + wait<float>           max seconds to wait a concurrent miss.
+        """
+        self.ttl = ttl
+        self.query = query
+        self.headers = headers
+        self.methods = methods
+        self.statuses = statuses
+        self.wait = wait
+        self.entries = LRU(max_bytes, weigh=lambda entry: entry.size)
+        self.pending = {}
+
+    async def key(self, req):
+        if self.query is None:
+            query = req.query_string
+        else:
+            querys = await req.querys
+            query = tuple(tuple(querys.get(name, ())) for name in self.query)
+        return (
+            req.method, req.path, query,
+            tuple(tuple(req.headers.getall(name)) for name in self.headers)
+        )
+
+    def lookup(self, key):
+        entry = self.entries.get(key)
+        if entry is not None and entry.expires <= monotonic():
+            self.entries.pop(key)
+            return None
+        return entry
+
+    async def __call__(self, this, req, res):
+        if (
+            req.method not in self.methods or
+            req.headers.get('Authorization') is not None or
+            'no-store' in directives(req.headers.get('Cache-Control'))
+        ):
+            return
+
+        key = await self.key(req)
+        entry = self.lookup(key)
+        if entry is None and key in self.pending:
+            future = self.pending[key]
+            try:
+                await wait_for(shield(future), self.wait)
+            except TimeoutError:
+                # the leader is gone, eg: cancelled.
+                if self.pending.get(key) is future:
+                    del self.pending[key]
+            entry = self.lookup(key)
+
+        if entry is not None:
+            return entry.replay(res)
+
+        if key not in self.pending:
+            future = self.pending[key] = get_event_loop().create_future()
+            # after all hooks, eg: cookies set by the handles.
+            res.start_response = partial(
+                self.capture, key, future, res, res.body, res.start_response
+            )
+
+    def capture(self, key, future, res, body, start_response, *args):
+        if self.pending.get(key) is future:
+            del self.pending[key]
+        headers = {name.lower(): value for name, value in res.headers.items()}
+        if (
+            (res.status_code or 200) in self.statuses and
+            # pushed segments, not `ok(T)` or a stream.
+            res.body is body and body and
+            'set-cookie' not in headers and
+            not {'no-store', 'private'} & directives(
+                headers.get('cache-control')
+            )
+        ):
+            self.entries.put(key, Entry(res, self.ttl))
+        if not future.done():
+            future.set_result(None)
+        return start_response(*args)
+
+    def invalidate(self, path=None, prefix=None):
+        """
+        Drop entries,
+            of a path, or paths under a prefix, or all of them.
+
+        + path<str>
+        + prefix<str>
+
+        - <int>         dropped entries.
+        """
+        if path is None and prefix is None:
+            count = len(self.entries)
+            self.entries.clear()
+            return count
+
+        keys = [
+            key for key in self.entries.items
+            if key[1] == path or (
+                prefix is not None and key[1].startswith(prefix)
+            )
+        ]
+        for key in keys:
+            self.entries.pop(key)
+        return len(keys)
@@ -0,0 +1,213 @@
+from asyncio import get_event_loop
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from urllib.parse import parse_qs, unquote_plus
+from functools import wraps
+from importlib import import_module
+import os
+
+from .utils import Ok, Err, Headers, to_bytes
+
+
+THREAD, PROCESS = 'thread', 'process'
+
+registry = {}
+
+
+class Busy(Err):
+    """
+    Executor queue is full.
+    """
+
+    status = 503
+
+
+class Snapshot(object):
+    """
+    Picklable request snapshot,
+        sync access for handles run in executor.
+    """
+
+    __slots__ = (
+        'method', 'uri', 'path', 'query_string', 'headers', 'params', 'body'
+    )
+
+    def __init__(self, req, body=None):
+        self.method = req.method
+        self.uri = req.uri
+        self.path = req.path
+        self.query_string = req.query_string
+        self.headers = Headers(req.headers.items())
+        self.headers.build()
+        self.params = dict(req._rest)
+        self.body = body
+
+    def rest(self, name):
+        value = self.params.get(name)
+        return unquote_plus(value) or None if value else None
+
+    def query(self, name):
+        return (lambda f=None, *_: f)(*parse_qs(
+            self.query_string, keep_blank_values=True
+        ).get(name, [None]))
+
+    def header(self, name):
+        return self.headers.get(name)
+
+
+class Detached(object):
+    """
+    Picklable response,
+        applied to the real response when the handle returns.
+        1. status, header, push, ok and err, as `Response`.
+        2. no hooks, no streams.
+    """
+
+    __slots__ = ('status_code', 'status_text', 'headers', 'body')
+
+    def __init__(self):
+        self.status_code = 0
+        self.status_text = None
+        self.headers = {}
+        self.body = []
+
+    def status(self, code, text=None):
+        self.status_code = code
+        self.status_text = text
+        return self
+
+    def header(self, name, value=""):
+        self.headers[name] = value
+        return self
+
+    def push(self, body):
+        if body:
+            self.body.append(to_bytes(body))
+        return self
+
+    def ok(self, T=None):
+        return Ok(T)
+
+    def err(self, E=None):
+        return Err(E)
+
+    def apply(self, res):
+        if self.status_code:
+            res.status(self.status_code, self.status_text)
+        res.headers.update(self.headers)
+        for chunk in self.body:
+            res.push(chunk)
+
+
+def call(handle, this, req, res):
+    """
+    Run a handle, in the executor.
+        a process pool gets the registry key,
+        the module is imported if the child hasn't, eg: spawn.
+
+    - <tuple>       (result, detached response)
+    """
+    if not callable(handle):
+        if handle not in registry:
+            import_module(handle[0])
+        handle = registry[handle]
+    try:
+        return handle(this, req, res), res
+    except Err as err:
+        return err, res
+
+
+class Pool(object):
+    """
+    Executor for CPU bound or blocking handles,
+        decorate a sync handle, then register it as usual.
+        1. the handle gets a `Snapshot` and a `Detached` response,
+            `this` is the node, or its name in a process pool.
+        2. a process pool handle must be defined at module level,
+            under a unique name.
+        3. past `queue` pending calls, responds 503.
+
+    eg:
+        @app.get(u('thumb'))
+        @processes
+        def thumb(this, req, res):
+            return res.push(resize(req.body)).ok()
+    """
+
+    def __init__(self, kind=THREAD, workers=None, queue=64, body=False):
+        """
+        + kind<str>         THREAD or PROCESS.
+        + workers<int>      pool size, None for the executor default.
+        + queue<int>        max pending calls.
+        + body<bool>        read request body into the snapshot.
+        """
+        self.kind = kind
+        self.workers = workers
+        self.queue = queue
+        self.body = body
+        self.pending = 0
+        self.executor = None
+        self.pid = None
+
+    def configure(self, **options):
+        """
+        Set options, before the pool is used.
+        """
+        for name, value in options.items():
+            if not hasattr(self, name):
+                raise TypeError("Unknown option {!r}".format(name))
+            setattr(self, name, value)
+        self.shutdown()
+        return self
+
+    def pool(self):
+        # created lazily, in each worker process.
+        if self.executor is None or self.pid != os.getpid():
+            self.executor = (
+                ProcessPoolExecutor if self.kind == PROCESS else
+                ThreadPoolExecutor
+            )(self.workers)
+            self.pid = os.getpid()
+        return self.executor
+
+    def shutdown(self):
+        if self.executor is not None and self.pid == os.getpid():
+            self.executor.shutdown(wait=False)
+        self.executor = None
+
+    def __call__(self, handle):
+        key = handle
+        if self.kind == PROCESS:
+            key = (handle.__module__, handle.__qualname__)
+            if '<' in key[1] or registry.get(key, handle) is not handle:
+                raise ValueError(
+                    "Process pool handle must be unique at module level, "
+                    "got {}.{}".format(*key)
+                )
+            registry[key] = handle
+
+        @wraps(handle)
+        async def offload(this, req, res):
+            if self.pending >= self.queue:
+                raise Busy("Service Unavailable")
+            self.pending += 1
+            try:
+                snapshot = Snapshot(
+                    req, (await req.body).getvalue() if self.body else None
+                )
+                result, detached = await get_event_loop().run_in_executor(
+                    self.pool(), call, key,
+                    str(this) if self.kind == PROCESS else this,
+                    snapshot, Detached()
+                )
+            finally:
+                self.pending -= 1
+
+            detached.apply(res)
+            if isinstance(result, Ok):
+                return res.ok(result.ok())
+            return result
+        return offload
+
+
+threads = Pool(THREAD)
+processes = Pool(PROCESS)
@@ -0,0 +1,442 @@
+from collections import OrderedDict
+from tempfile import SpooledTemporaryFile
+from urllib.parse import parse_qsl
+import re
+
+from .utils import Err
+
+
+PART, DATA, PART_END, END = range(4)
+PREAMBLE, DELIMITER, HEADERS, BODY, DONE = range(5)
+
+option = re.compile(r';\s*([^\s=;]+)\s*(?:=\s*("(?:[^"\\]|\\.)*"|[^;]*))?')
+
+
+class FormError(Err):
+    """
+    Malformed form body.
+    """
+
+    status = 400
+
+
+class PartTooLarge(FormError):
+    """
+    Form part exceeds `Request.max_part`.
+    """
+
+    status = 413
+
+
+def parse_options(value):
+    """
+    Parse header value with options,
+        eg: Content-Type, Content-Disposition.
+
+    >>> parse_options('text/plain')
+    ('text/plain', {})
+    >>> ctype, options = parse_options(
+    ...     'Form-Data; name="file"; filename="a;\\\\"b\\\\".txt"'
+    ... )
+    >>> ctype, sorted(options.items())
+    ('form-data', [('filename', 'a;"b".txt'), ('name', 'file')])
+
+    - <tuple>       (value, options)
+    """
+    main, _, rest = value.partition(';')
+    options = {}
+    for key, val in option.findall(';' + rest if rest else ''):
+        val = val.strip()
+        if val.startswith('"') and val.endswith('"') and len(val) > 1:
+            val = re.sub(r'\\(.)', r'\1', val[1:-1])
+        options[key.lower()] = val
+    return main.strip().lower(), options
+
+
+def parse_headers(block):
+    """
+    Parse part headers block.
+
+    >>> sorted(parse_headers(b'A: 1\\r\\nContent-Type: text/plain').items())
+    [('a', '1'), ('content-type', 'text/plain')]
+    """
+    headers = {}
+    for line in block.split(b"\r\n"):
+        name, sep, value = line.decode('utf-8', 'replace').partition(':')
+        if not sep:
+            raise FormError("Malformed part header")
+        headers[name.strip().lower()] = value.strip()
+    return headers
+
+
+class MultipartParser(object):
+    """
+    Incremental multipart parser,
+        feed bytes, get events.
+        1. (PART, headers), (DATA, bytes), (PART_END, None), (END, None).
+        2. keeps at most a delimiter of bytes between feeds.
+
+    >>> parser = MultipartParser(b"xx")
+    >>> events = []
+    >>> for c in b'--xx\\r\\nA: 1\\r\\n\\r\\nhi\\r\\n--xx--\\r\\n':
+    ...     events.extend(parser.feed(bytes([c])))
+    >>> b"".join(data for event, data in events if event == DATA)
+    b'hi'
+    >>> [event for event, _ in events if event != DATA]
+    [0, 2, 3]
+    """
+
+    def __init__(self, boundary, max_header=1 << 14):
+        """
+        + boundary<bytes>       multipart boundary.
+        + max_header<int>       max bytes of a part headers block.
+        """
+        self.delimiter = b"\r\n--" + boundary
+        self.buffer = b"\r\n"
+        self.state = PREAMBLE
+        self.max_header = max_header
+
+    @property
+    def done(self):
+        return self.state == DONE
+
+    def feed(self, data):
+        """
+        Feed bytes.
+
+        + data<bytes>
+
+        - <list>        events.
+        """
+        self.buffer += data
+        events = []
+        while True:
+            if self.state in (PREAMBLE, BODY):
+                index = self.buffer.find(self.delimiter)
+                if index < 0:
+                    keep = len(self.delimiter) - 1
+                    if self.state == BODY and len(self.buffer) > keep:
+                        events.append((DATA, self.buffer[:-keep]))
+                    self.buffer = self.buffer[-keep:]
+                    break
+                if self.state == BODY:
+                    if index:
+                        events.append((DATA, self.buffer[:index]))
+                    events.append((PART_END, None))
+                self.buffer = self.buffer[index + len(self.delimiter):]
+                self.state = DELIMITER
+
+            elif self.state == DELIMITER:
+                if len(self.buffer) < 2:
+                    break
+                tail, self.buffer = self.buffer[:2], self.buffer[2:]
+                if tail == b"--":
+                    self.state = DONE
+                    events.append((END, None))
+                elif tail == b"\r\n":
+                    self.state = HEADERS
+                else:
+                    raise FormError("Malformed multipart boundary")
+
+            elif self.state == HEADERS:
+                if self.buffer.startswith(b"\r\n"):
+                    block, self.buffer = b"", self.buffer[2:]
+                else:
+                    index = self.buffer.find(b"\r\n\r\n")
+                    if index < 0:
+                        if len(self.buffer) > self.max_header:
+                            raise PartTooLarge("Part headers too large")
+                        break
+                    block = self.buffer[:index]
+                    self.buffer = self.buffer[index + 4:]
+                events.append((PART, parse_headers(block) if block else {}))
+                self.state = BODY
+
+            else:
+                # epilogue is ignored.
+                self.buffer = b""
+                break
+
+        return events
+
+
+class Part(object):
+    """
+    Multipart part,
+        body read as a stream, in order.
+    """
+
+    def __init__(self, reader, headers):
+        self.reader = reader
+        self.headers = headers
+        self.size = 0
+        self.done = False
+
+        _, self.disposition = parse_options(
+            headers.get('content-disposition', "")
+        )
+        self.type, options = parse_options(
+            headers.get('content-type', "text/plain")
+        )
+        self.charset = options.get('charset', "utf-8")
+
+    @property
+    def name(self):
+        return self.disposition.get('name')
+
+    @property
+    def filename(self):
+        return self.disposition.get('filename')
+
+    async def read(self):
+        """
+        Read a chunk of part body.
+            &asyncio
+
+        - <bytes>       b"" when part ends.
+        """
+        if self.done:
+            return b""
+        event, data = await self.reader.event()
+        if event == PART_END:
+            self.done = True
+            return b""
+        self.size += len(data)
+        if self.reader.max_part is not None and \
+                self.size > self.reader.max_part:
+            raise PartTooLarge("Form part too large")
+        return data
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        chunk = await self.read()
+        if not chunk:
+            raise StopAsyncIteration
+        return chunk
+
+
+class MultipartReader(object):
+    """
+    Multipart reader,
+        parts in order, over a request body stream.
+    """
+
+    def __init__(self, read, boundary, max_part=None):
+        """
+        + read<async function>         read a chunk, b"" when drained.
+        + boundary<bytes>               multipart boundary.
+        + max_part<int>                 max bytes of a part.
+        """
+        self.read = read
+        self.parser = MultipartParser(boundary)
+        self.events = []
+        self.part = None
+        self.max_part = max_part
+
+    async def event(self):
+        while not self.events:
+            chunk = await self.read()
+            if not chunk:
+                raise FormError("Unexpected end of form")
+            self.events = self.parser.feed(chunk)
+            self.events.reverse()
+        return self.events.pop()
+
+    async def next(self):
+        """
+        Next part, the current one is drained.
+            &asyncio
+
+        - <Part>
+        - <None>        when form ends.
+        """
+        if self.part is not None:
+            while (await self.part.read()):
+                pass
+        if self.parser.done and not self.events:
+            return None
+
+        event, headers = await self.event()
+        if event == END:
+            return None
+        if event != PART:
+            raise FormError("Malformed multipart body")
+
+        self.part = Part(self, headers)
+        return self.part
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        part = await self.next()
+        if part is None:
+            raise StopAsyncIteration
+        return part
+
+
+class Field(object):
+    """
+    Form field,
+        `value` is str, or `file` for file parts.
+    """
+
+    def __init__(
+        self, name, value=None, file=None, filename=None, headers=None
+    ):
+        self.name = name
+        self.file = file
+        self.filename = filename
+        self.headers = {} if headers is None else headers
+        self._value = value
+
+    def __repr__(self):
+        return "Field<{!r}, {!r}>".format(
+            self.name, self.filename or self._value
+        )
+
+    @property
+    def value(self):
+        """
+        - <str>
+        - <bytes>       file contents.
+        """
+        if self.file is None:
+            return self._value
+        self.file.seek(0)
+        value = self.file.read()
+        self.file.seek(0)
+        return value
+
+
+class FormData(object):
+    """
+    Form data,
+        compatible with `cgi.FieldStorage` access.
+    """
+
+    def __init__(self):
+        self.fields = OrderedDict()
+
+    def add(self, field):
+        self.fields.setdefault(field.name, []).append(field)
+
+    def keys(self):
+        return list(self.fields)
+
+    def __iter__(self):
+        return iter(self.fields)
+
+    def __len__(self):
+        return len(self.fields)
+
+    def __contains__(self, name):
+        return name in self.fields
+
+    def __getitem__(self, name):
+        fields = self.fields[name]
+        return fields[0] if len(fields) == 1 else fields
+
+    def getlist(self, name):
+        return [field.value for field in self.fields.get(name, ())]
+
+    def getfirst(self, name, default=None):
+        fields = self.fields.get(name)
+        return fields[0].value if fields else default
+
+    def getvalue(self, name, default=None):
+        values = self.getlist(name)
+        if not values:
+            return default
+        return values[0] if len(values) == 1 else values
+
+    def getfile(self, name):
+        """
+        - <file>        the first file part of name.
+        - <None>
+        """
+        for field in self.fields.get(name, ()):
+            if field.file is not None:
+                return field.file
+
+
+async def parse_multipart(read, boundary, max_part=None, spool=1 << 20):
+    """
+    Parse multipart/form-data.
+        &asyncio
+        file parts spill to disk past `spool` bytes.
+
+    - <FormData>
+    """
+    form = FormData()
+    reader = MultipartReader(read, boundary, max_part)
+    while True:
+        part = await reader.next()
+        if part is None:
+            break
+        if part.name is None:
+            continue
+
+        if part.filename is None:
+            chunks = []
+            while True:
+                chunk = await part.read()
+                if not chunk:
+                    break
+                chunks.append(chunk)
+            form.add(Field(
+                part.name,
+                value=b"".join(chunks).decode(part.charset, 'replace'),
+                headers=part.headers
+            ))
+        else:
+            file = SpooledTemporaryFile(max_size=spool)
+            while True:
+                chunk = await part.read()
+                if not chunk:
+                    break
+                file.write(chunk)
+            file.seek(0)
+            form.add(Field(
+                part.name,
+                file=file,
+                filename=part.filename,
+                headers=part.headers
+            ))
+
+    return form
+
+
+async def parse_urlencoded(read, max_part=None, charset="utf-8"):
+    """
+    Parse application/x-www-form-urlencoded,
+        pair by pair as chunks arrive.
+        &asyncio
+
+    - <FormData>
+    """
+    form = FormData()
+    tail = b""
+    while True:
+        chunk = await read()
+        pairs = (tail + chunk).split(b"&")
+        tail = pairs.pop() if chunk else b""
+        if max_part is not None and any(
+            len(pair) > max_part for pair in pairs + [tail]
+        ):
+            raise PartTooLarge("Form part too large")
+
+        for pair in pairs:
+            for name, value in parse_qsl(
+                pair.decode('ascii', 'replace'),
+                keep_blank_values=True,
+                encoding=charset
+            ):
+                form.add(Field(name, value=value))
+
+        if not chunk:
+            break
+
+    return form
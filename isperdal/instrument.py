@@ -0,0 +1,160 @@
+from bisect import bisect_left
+from socket import socket, AF_INET, SOCK_DGRAM
+from logging import getLogger, DEBUG
+import re
+
+
+ROUTE, HANDLE, TRIGGER, HOOK = 'route', 'handle', 'trigger', 'hook'
+LAG, SLOW = 'lag', 'slow'
+
+BUCKETS = (
+    .0001, .00025, .0005, .001, .0025, .005,
+    .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10
+)
+
+
+def label(fn):
+    """
+    Name of a handle or hook.
+
+    >>> def index(this, req, res):
+    ...     pass
+    >>> label(index), label(lambda: None)
+    ('index', '<lambda>')
+    """
+    return getattr(fn, '__qualname__', None) or repr(fn)
+
+
+class Histogram(object):
+    """
+    In-memory timing histogram,
+        per (kind, name), fixed buckets in seconds.
+
+    >>> hist = Histogram()
+    >>> for seconds in (.0002, .0003, .002, 3):
+    ...     hist.timing(HANDLE, '/ index', seconds)
+    >>> hist.count(HANDLE, '/ index'), hist.percentile(HANDLE, '/ index', .5)
+    (4, 0.0005)
+    >>> hist.percentile(HANDLE, '/ index', .99), hist.count(ROUTE, '/')
+    (5, 0)
+    """
+
+    def __init__(self, buckets=BUCKETS):
+        """
+        + buckets<tuple>    upper bounds, ascending.
+        """
+        self.buckets = tuple(buckets)
+        self.stats = {}
+
+    def timing(self, kind, name, seconds):
+        try:
+            counts, total = self.stats[kind, name]
+        except KeyError:
+            counts, total = self.stats[kind, name] = (
+                [0] * (len(self.buckets) + 1), [0.0]
+            )
+        counts[bisect_left(self.buckets, seconds)] += 1
+        total[0] += seconds
+
+    def count(self, kind, name):
+        stats = self.stats.get((kind, name))
+        return sum(stats[0]) if stats else 0
+
+    def sum(self, kind, name):
+        stats = self.stats.get((kind, name))
+        return stats[1][0] if stats else 0.0
+
+    def percentile(self, kind, name, q):
+        """
+        Upper bound of the bucket holding the q quantile.
+
+        + q<float>          0 ~ 1.
+
+        - <float>
+        - <None>            no timing recorded.
+        """
+        stats = self.stats.get((kind, name))
+        if not stats:
+            return None
+        rank = q * sum(stats[0])
+        seen = 0
+        for bound, count in zip(self.buckets + (float('inf'),), stats[0]):
+            seen += count
+            if count and seen >= rank:
+                return bound
+
+    def keys(self):
+        return list(self.stats)
+
+    def clear(self):
+        self.stats.clear()
+
+
+class LogSink(object):
+    """
+    Timing as log lines.
+    """
+
+    def __init__(self, logger=None, level=DEBUG):
+        self.logger = logger or getLogger('isperdal.timing')
+        self.level = level
+
+    def timing(self, kind, name, seconds):
+        self.logger.log(
+            self.level, "%s %s %.3fms", kind, name, seconds * 1000
+        )
+
+
+class StatsdSink(object):
+    """
+    Timing to a statsd compatible server, over UDP.
+        1. `<prefix>.<kind>.<name>:<ms>|ms`, name sanitized.
+        2. never blocks, datagrams dropped on error.
+    """
+
+    def __init__(self, host="127.0.0.1", port=8125, prefix="isperdal"):
+        self.address = (host, port)
+        self.prefix = prefix
+        self.names = {}
+        self.sock = socket(AF_INET, SOCK_DGRAM)
+        self.sock.setblocking(False)
+
+    def metric(self, kind, name):
+        """
+        >>> sink = StatsdSink()
+        >>> sink.metric(HANDLE, '/posts/:id show')
+        'isperdal.handle.posts_id_show'
+        >>> sink.close()
+        """
+        try:
+            return self.names[kind, name]
+        except KeyError:
+            metric = self.names[kind, name] = ".".join(filter(None, (
+                self.prefix, kind,
+                re.sub(r'[^\w\-]+', '_', str(name)).strip('_')
+            )))
+            return metric
+
+    def timing(self, kind, name, seconds):
+        try:
+            self.sock.sendto("{}:{:.3f}|ms".format(
+                self.metric(kind, name), seconds * 1000
+            ).encode(), self.address)
+        except OSError:
+            pass
+
+    def close(self):
+        self.sock.close()
+
+
+class Tee(object):
+    """
+    Fan out timing to multiple sinks.
+    """
+
+    def __init__(self, *sinks):
+        self.sinks = sinks
+
+    def timing(self, kind, name, seconds):
+        for sink in self.sinks:
+            sink.timing(kind, name, seconds)
@@ -0,0 +1,345 @@
+from asyncio import get_event_loop
+from mmap import mmap, ACCESS_READ
+from struct import Struct
+from time import monotonic, time
+from fcntl import flock, LOCK_SH, LOCK_EX, LOCK_NB
+from glob import glob
+import json
+import os
+
+from .node import Node
+from .instrument import Histogram, BUCKETS
+
+
+HEADER = Struct('<QQ')
+REQUEST = 'request'
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def escape(value):
+    """
+    >>> escape('a"b\\\\')
+    'a\\\\"b\\\\\\\\'
+    """
+    return str(value).replace('\\', '\\\\') \
+        .replace('"', '\\"').replace('\n', '\\n')
+
+
+def held(path):
+    """
+    Whether a live worker holds the file,
+        workers keep a shared lock on their own file until exit.
+
+    - <bool>
+    """
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        flock(fd, LOCK_EX | LOCK_NB)
+    except BlockingIOError:
+        return True
+    finally:
+        os.close(fd)
+    return False
+
+
+def load(path):
+    """
+    Read a worker snapshot file,
+        retry while the worker is writing it.
+
+    - <dict>
+    - <None>
+    """
+    with open(path, 'rb') as fd:
+        size = os.fstat(fd.fileno()).st_size
+        if size < HEADER.size:
+            return None
+        with mmap(fd.fileno(), size, access=ACCESS_READ) as mm:
+            for _ in range(8):
+                seq, length = HEADER.unpack_from(mm, 0)
+                if seq % 2 or HEADER.size + length > size:
+                    continue
+                payload = mm[HEADER.size:HEADER.size + length]
+                if HEADER.unpack_from(mm, 0)[0] == seq:
+                    return json.loads(payload.decode()) if length else None
+    return None
+
+
+def merge(snapshots):
+    """
+    Sum of snapshots, in snapshot format.
+
+    >>> total = merge([
+    ...     {'inflight': 1, 'requests': [['/', 200, 1]],
+    ...         'triggers': [[404, 1]], 'latency': [['/', [1, 0], 0.5]]},
+    ...     {'inflight': 0, 'requests': [['/', 200, 2]],
+    ...         'triggers': [], 'latency': [['/', [0, 2], 1.5]]}
+    ... ])
+    >>> total['requests'], total['latency']
+    ([['/', 200, 3]], [['/', [1, 2], 2.0]])
+
+    - <dict>
+    """
+    requests, triggers, latency = {}, {}, {}
+    inflight = 0
+    for snapshot in snapshots:
+        inflight += snapshot['inflight']
+        for route, status, count in snapshot['requests']:
+            key = (route, status)
+            requests[key] = requests.get(key, 0) + count
+        for code, count in snapshot['triggers']:
+            triggers[code] = triggers.get(code, 0) + count
+        for route, counts, total in snapshot['latency']:
+            stats = latency.get(route)
+            if stats is None:
+                latency[route] = [list(counts), total]
+            else:
+                stats[0] = [a + b for a, b in zip(stats[0], counts)]
+                stats[1] += total
+    return {
+        'pid': None,
+        'inflight': inflight,
+        'requests': [
+            [route, status, count]
+            for (route, status), count in sorted(requests.items())
+        ],
+        'triggers': [list(item) for item in sorted(triggers.items())],
+        'latency': [
+            [route, counts, total]
+            for route, (counts, total) in sorted(latency.items())
+        ]
+    }
+
+
+class Metrics(object):
+    """
+    Request metrics collector,
+        counters per route pattern and status, in-flight gauge,
+        latency histogram per route, and triggers per status.
+        1. each worker counts in its own process, no locks.
+        2. with `path`, workers flush to mmap files in it,
+            at most every `interval` seconds, and once more
+            `interval` after the last request,
+            and a scrape aggregates all of them.
+        3. files of exited workers are folded into a retained total,
+            counters never go backwards.
+
+    eg:
+        metrics = Metrics("/run/app-metrics")
+        app.add(metrics.node())
+        app.run(workers=4, metrics=metrics)
+    """
+
+    def __init__(self, path=None, buckets=BUCKETS, interval=1.0):
+        """
+        + path<str>         directory of worker files, shared by workers.
+        + buckets<tuple>    latency upper bounds, in seconds.
+        + interval<float>   min seconds between flushes.
+        """
+        self.path = path
+        self.interval = interval
+        self.requests = {}
+        self.triggers = {}
+        self.inflight = 0
+        self.latency = Histogram(buckets)
+
+        self.pid = None
+        self.fd = None
+        self.mm = None
+        self.seq = 0
+        self.due = 0
+        self.timer = None
+
+    def begin(self):
+        self.inflight += 1
+
+    def end(self, route, status, seconds):
+        self.inflight -= 1
+        key = (route, status)
+        self.requests[key] = self.requests.get(key, 0) + 1
+        self.latency.timing(REQUEST, route, seconds)
+        if self.path is None:
+            return
+        now = monotonic()
+        if now >= self.due:
+            self.flush()
+        elif self.timer is None:
+            # flush the tail, if the worker goes idle.
+            self.timer = get_event_loop().call_later(
+                self.due - now, self.flush
+            )
+
+    def trigger(self, code):
+        self.triggers[code] = self.triggers.get(code, 0) + 1
+
+    def snapshot(self):
+        return {
+            'pid': os.getpid(),
+            'inflight': self.inflight,
+            'requests': [
+                [route, status, count]
+                for (route, status), count in self.requests.items()
+            ],
+            'triggers': list(self.triggers.items()),
+            'latency': [
+                [name, counts, total[0]]
+                for (_, name), (counts, total) in self.latency.stats.items()
+            ]
+        }
+
+    def open(self, size):
+        if self.mm is not None:
+            self.mm.close()
+        if self.pid != os.getpid():
+            if self.fd is not None:
+                os.close(self.fd)
+            self.pid = os.getpid()
+            # unique per process, even if the pid is reused.
+            name = os.path.join(self.path, "{}-{:x}".format(
+                self.pid, int(time() * 1e6)
+            ))
+            self.fd = os.open(
+                name + ".tmp", os.O_RDWR | os.O_CREAT | os.O_EXCL, 0o644
+            )
+            # locked before it's visible, held until exit.
+            flock(self.fd, LOCK_SH)
+            os.rename(name + ".tmp", name + ".metrics")
+        os.ftruncate(self.fd, size)
+        self.mm = mmap(self.fd, size)
+
+    def flush(self):
+        """
+        Write snapshot of this worker to its file.
+        """
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        payload = json.dumps(self.snapshot()).encode()
+        size = HEADER.size + len(payload)
+        if self.mm is None or self.pid != os.getpid() or size > len(self.mm):
+            self.open(max(size * 2, 1 << 16))
+
+        HEADER.pack_into(self.mm, 0, self.seq + 1, 0)
+        self.mm[HEADER.size:size] = payload
+        self.seq += 2
+        HEADER.pack_into(self.mm, 0, self.seq, len(payload))
+        self.due = monotonic() + self.interval
+
+    def collect(self):
+        """
+        Snapshots of all workers,
+            exited workers are folded into the retained total,
+            their in-flight is dropped.
+
+        - <list>
+        """
+        if self.path is None:
+            return [self.snapshot()]
+
+        self.flush()
+        retained, snapshots, dead = [], [], []
+        path = os.path.join(self.path, "retained.json")
+        lock = os.open(
+            os.path.join(self.path, "retained.lock"),
+            os.O_RDWR | os.O_CREAT, 0o644
+        )
+        try:
+            # one scrape at a time, a file is folded exactly once.
+            flock(lock, LOCK_EX)
+            try:
+                with open(path) as fd:
+                    retained.append(json.load(fd))
+            except FileNotFoundError:
+                pass
+
+            for name in sorted(glob(os.path.join(self.path, "*.metrics"))):
+                snapshot = load(name)
+                if held(name):
+                    if snapshot is not None:
+                        snapshots.append(snapshot)
+                    continue
+                if snapshot is not None:
+                    snapshot['inflight'] = 0
+                    dead.append(snapshot)
+                os.unlink(name)
+
+            if dead:
+                retained = [merge(retained + dead)]
+                with open(path + ".tmp", 'w') as fd:
+                    json.dump(retained[0], fd)
+                os.replace(path + ".tmp", path)
+        finally:
+            os.close(lock)
+        return retained + snapshots
+
+    def expose(self):
+        """
+        Text exposition format, aggregated over workers.
+
+        - <str>
+        """
+        buckets = self.latency.buckets
+        total = merge(self.collect())
+
+        lines = [
+            "# HELP isperdal_requests_total Requests by route and status.",
+            "# TYPE isperdal_requests_total counter"
+        ]
+        for route, status, count in total['requests']:
+            lines.append(
+                'isperdal_requests_total{{route="{}",status="{}"}} {}'.format(
+                    escape(route), status, count
+                )
+            )
+
+        lines.extend((
+            "# HELP isperdal_requests_in_flight Requests being handled.",
+            "# TYPE isperdal_requests_in_flight gauge",
+            "isperdal_requests_in_flight {}".format(total['inflight']),
+            "# HELP isperdal_request_duration_seconds Request latency.",
+            "# TYPE isperdal_request_duration_seconds histogram"
+        ))
+        for route, counts, seconds in total['latency']:
+            seen = 0
+            for bound, count in zip(
+                ["{:g}".format(b) for b in buckets] + ["+Inf"], counts
+            ):
+                seen += count
+                lines.append(
+                    'isperdal_request_duration_seconds_bucket'
+                    '{{route="{}",le="{}"}} {}'.format(
+                        escape(route), bound, seen
+                    )
+                )
+            lines.append(
+                'isperdal_request_duration_seconds_sum'
+                '{{route="{}"}} {!r}'.format(escape(route), seconds)
+            )
+            lines.append(
+                'isperdal_request_duration_seconds_count'
+                '{{route="{}"}} {}'.format(escape(route), seen)
+            )
+
+        lines.extend((
+            "# HELP isperdal_triggers_total Error triggers by status.",
+            "# TYPE isperdal_triggers_total counter"
+        ))
+        for code, count in total['triggers']:
+            lines.append(
+                'isperdal_triggers_total{{code="{}"}} {}'.format(code, count)
+            )
+
+        return "\n".join(lines) + "\n"
+
+    def node(self, name="metrics"):
+        """
+        Scrape endpoint, mount it on the tree.
+            eg: app.add(metrics.node())
+
+        - <node>
+        """
+        def scrape(this, req, res):
+            return res.header("Content-Type", CONTENT_TYPE) \
+                .push(self.expose()).ok()
+
+        return Node(name).all(('GET', 'HEAD'))(scrape)
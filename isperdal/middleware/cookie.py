@@ -1,16 +1,22 @@
-from asyncio import coroutine
 from http.cookies import SimpleCookie
 
-from isperdal.utils import mount
+from isperdal.utils import extend, state
+from isperdal.request import Request
+from isperdal.response import Response
 
 
 def cookie(this, req, res):
     """
+    Cookie middleware.
+        methods are registered on import, cookies are parsed
+        and the hook added only when first used,
+        so this handle is kept for compatibility only.
+
     >>> from isperdal.request import Request
     >>> from isperdal.response import Response
     >>> from isperdal import Node as u
 
-    >>> from asyncio import coroutine, get_event_loop
+    >>> from asyncio import get_event_loop
     >>> loop = get_event_loop()
 
     >>> env = {}
@@ -18,6 +24,8 @@ def cookie(this, req, res):
     >>> req, res = Request(env), Response(lambda *_: None)
 
     >>> cookie(None, req, res)
+    >>> req.ext is None and res.ext is None and not res.hooks
+    True
 
     >>> loop.run_until_complete(req.cookies())
     <SimpleCookie: bar='baz'>
@@ -30,45 +38,56 @@ def cookie(this, req, res):
     >>> res.headers['Set-Cookie']
     'foo=bar'
     """
-    @mount(req, 'cookies')
-    @coroutine
-    def req_cookies(self):
-        if not hasattr(self, '__cookies'):
-            self.__cookies = SimpleCookie((yield from self.header('Cookie')))
-        return self.__cookies
-
-    @mount(req, 'cookie')
-    @coroutine
-    def req_cookie(self, key):
-        return (lambda v: v if v is None else v.value)((
-            yield from self.cookies()
-        ).get(key))
-
-    res.cookies = SimpleCookie()
-
-    @mount(res, 'cookie')
-    def res_cookie(self, key, value):
-        if isinstance(value, dict):
-            if key in res.__cookie:
-                self.cookies[key] = value.get('value', "")
-            for k, v in value.items():
-                if k in (
-                    'expires',
-                    'max-age',
-                    'comment',
-                    'version',
-                    'domain',
-                    'path',
-                    'httponly',
-                    'secure'
-                ):
-                    res.cookies[key][k] = v
-        else:
-            res.cookies[key] = value
-
-        return self
-
-    @res.hook
-    def hook_cookie(res):
-        if hasattr(res, 'cookies') and res.cookies:
-            res.header(*res.cookies.output().split(': ', 1))
+
+
+@extend(Request)
+async def cookies(self):
+    return state(self, 'cookies', lambda: SimpleCookie(
+        "; ".join(self.headers.getall('Cookie'))
+    ))
+
+
+@extend(Request, 'cookie')
+async def req_cookie(self, key):
+    return (lambda v: v if v is None else v.value)((
+        await self.cookies()
+    ).get(key))
+
+
+def res_cookies_new(res):
+    res.hook(hook_cookie)
+    return SimpleCookie()
+
+
+@extend(Response, 'cookies')
+@property
+def res_cookies(self):
+    return state(self, 'cookies', lambda: res_cookies_new(self))
+
+
+@extend(Response, 'cookie')
+def res_cookie(self, key, value):
+    if isinstance(value, dict):
+        if 'value' in value or key not in self.cookies:
+            self.cookies[key] = value.get('value', "")
+        for k, v in value.items():
+            if k in (
+                'expires',
+                'max-age',
+                'comment',
+                'version',
+                'domain',
+                'path',
+                'httponly',
+                'secure'
+            ):
+                self.cookies[key][k] = v
+    else:
+        self.cookies[key] = value
+
+    return self
+
+
+def hook_cookie(res):
+    if res.cookies:
+        res.header(*res.cookies.output().split(': ', 1))
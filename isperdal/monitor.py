@@ -0,0 +1,109 @@
+from asyncio import get_event_loop
+from threading import Thread, Event, get_ident
+from collections import deque
+from traceback import format_stack
+from logging import getLogger
+from time import monotonic
+import sys
+
+from .node import Node
+from .instrument import LAG, SLOW
+from .profiler import tag
+
+
+class Monitor(object):
+    """
+    Event loop lag monitor.
+        1. a heartbeat on the loop measures scheduling delay,
+            reported as `lag` timing.
+        2. a watchdog thread snapshots the loop thread stack
+            once the heartbeat is `threshold` late,
+            the route and handle blocking it are reported as `slow` timing,
+            and logged, with the stack in `Node.debug` mode.
+        3. reports to `sink`, or the `Node.instrument` sink.
+
+    eg:
+        app.run(monitor=Monitor(threshold=0.05))
+    """
+
+    def __init__(self, threshold=0.05, interval=0.1, sink=None, logger=None):
+        """
+        + threshold<float>  seconds of lag to flag.
+        + interval<float>   seconds between heartbeats.
+        + sink              timing sink.
+        """
+        self.threshold = threshold
+        self.interval = interval
+        self.sink = sink
+        self.logger = logger or getLogger('isperdal.monitor')
+        self.blocks = deque(maxlen=64)
+
+        self.loop = None
+        self.ident = None
+        self.handle = None
+        self.thread = None
+        self.stopped = Event()
+        self.expected = None
+        self.due = None
+        self.block = None
+
+    def start(self, loop=None):
+        """
+        Start monitoring the loop,
+            called from the loop thread.
+        """
+        if self.thread is not None:
+            return
+        self.loop = loop or get_event_loop()
+        self.ident = get_ident()
+        self.stopped.clear()
+        self.schedule()
+        self.thread = Thread(target=self.watch, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        if self.thread is None:
+            return
+        self.handle.cancel()
+        self.stopped.set()
+        self.thread.join()
+        self.thread = None
+
+    def schedule(self):
+        self.expected = self.loop.time() + self.interval
+        self.due = monotonic() + self.interval + self.threshold
+        self.handle = self.loop.call_later(self.interval, self.beat)
+
+    def beat(self):
+        due, self.due = self.due, float('inf')
+        lag = max(self.loop.time() - self.expected, 0)
+        block, self.block = self.block, None
+        # a snapshot is only of the beat it was late for.
+        block = block[1:] if block and block[0] == due else None
+        sink = self.sink or Node.sink
+        if sink is not None:
+            sink.timing(LAG, "loop", lag)
+
+        if lag > self.threshold:
+            route, handle, stack = block or ("(unknown)", "-", "")
+            self.blocks.append((route, handle, lag, stack))
+            if sink is not None:
+                sink.timing(SLOW, "{} {}".format(route, handle), lag)
+            self.logger.warning(
+                "event loop blocked %.1fms by %s %s%s",
+                lag * 1000, route, handle,
+                "\n" + stack if Node.debug and stack else ""
+            )
+
+        self.schedule()
+
+    def watch(self):
+        while not self.stopped.wait(self.threshold / 4):
+            due = self.due
+            if self.block is not None or monotonic() < due:
+                continue
+            frame = sys._current_frames().get(self.ident)
+            if frame is None:
+                continue
+            route, handle = tag(frame) or ("(loop)", "-")
+            self.block = (due, route, handle, "".join(format_stack(frame)))
@@ -1,29 +1,41 @@
 from copy import copy
-from asyncio import async, coroutine, iscoroutinefunction
+from asyncio import ensure_future, iscoroutinefunction
+from inspect import isawaitable, isgeneratorfunction
+from types import coroutine
 from functools import reduce
-from types import FunctionType
+from time import perf_counter as clock
 from traceback import format_exc
+from weakref import WeakSet
 
-from .request import Request
-from .response import Response
+from .request import Request, TooLarge
+from .response import Response, iterable
 from .adapter import AioHTTPServer
-from .utils import Result, Ok, Err, unok
+from .utils import Result, Ok, Err, LRU, unok, asyncfn
+from .instrument import ROUTE, HANDLE, TRIGGER, label
 
 
 codes = {
-    302: coroutine(
+    302: asyncfn(
         lambda this, req, res, err:
             res.header("Location", err).ok()
     ),
-    400: coroutine(
+    400: asyncfn(
         lambda this, req, res, err:
             res.push("400 {}".format(err)).ok()
     ),
-    404: coroutine(
+    404: asyncfn(
         lambda this, req, res, err:
             res.push("404 {}".format(err)).ok()
     ),
-    500: coroutine(
+    413: asyncfn(
+        lambda this, req, res, err:
+            res.push("413 {}".format(err)).ok()
+    ),
+    503: asyncfn(
+        lambda this, req, res, err:
+            res.push("503 {}".format(err)).ok()
+    ),
+    500: asyncfn(
         lambda this, req, res, err:
             print(err) or res.push(
                 err if this.debug else "500 Unknown Error"
@@ -32,12 +44,48 @@ codes = {
 }
 
 
+SYNC, ASYNC, SOCKET = range(3)
+
+
+def classify(handle):
+    """
+    Kind of handle, decided once at registration.
+        1. SOCKET, a WebSocket class.
+        2. ASYNC, coroutine function,
+            or generator function, wrapped as native coroutine.
+        3. SYNC, anything else, called directly.
+
+    - <tuple>       (kind, handle)
+    """
+    if isinstance(handle, type):
+        # and issubclass(handle, WebSocket):
+        return SOCKET, handle
+    if iscoroutinefunction(handle):
+        return ASYNC, handle
+    if isgeneratorfunction(handle):
+        return ASYNC, coroutine(handle)
+    return SYNC, handle
+
+
+def pattern(route, depth=None):
+    """
+    Route pattern, of resolved route steps.
+
+    >>> pattern(((Node('posts/'), None, None), (Node(':id'), 'id', '1')))
+    '/posts/:id'
+    """
+    return "/" + "".join(node for node, _, _ in route[:depth])
+
+
 class Node(str):
     """
     Microwave Node.
     """
 
     debug = True
+    caches = WeakSet()
+    sink = None
+    metrics = None
 
     def __init__(self, *args, **kwargs):
         """
@@ -60,14 +108,32 @@ class Node(str):
             )
         }
         self.codes = {}
+        self.chains = None
+        self.compiled = None
+        self.lru = None
+        # copies share subnode and handles.
+        self.family = [self]
 
     def copy(self, name):
         node = Node(name)
         node.subnode = self.subnode
         node.handles = self.handles
         node.codes = self.codes
+        node.family = self.family
+        self.family.append(node)
         return node
 
+    def reset(self, chains=False, compiled=False):
+        """
+        Drop the classified handles or route index,
+            of the node and all its copies.
+        """
+        for node in self.family:
+            if chains:
+                node.chains = None
+            if compiled:
+                node.compiled = None
+
     def route(self, *nodes, methods=('HEAD', 'GET', 'POST')):
         """
         The basic route map.
@@ -102,15 +168,10 @@ class Node(str):
         """
         def all_wrap(*handles):
             for method in (methods or self.handles.keys()):
-                self.handles[method.upper()].extend(map((
-                    lambda handle:
-                        coroutine(handle)
-                        if (
-                            isinstance(handle, FunctionType) and
-                            not iscoroutinefunction(handle)
-                        ) else
-                        handle
-                ), handles))
+                self.handles[method.upper()].extend(handles)
+            self.reset(chains=True)
+            for lru in self.caches:
+                lru.clear()
             return self
         return all_wrap
 
@@ -126,11 +187,16 @@ class Node(str):
             exist = self.subnode[self.subnode.index(node)]
             for m in node.handles:
                 exist.handles[m].extend(node.handles[m])
+            exist.reset(chains=True)
 
             for n in node.subnode:
                 exist.add(n)
         else:
             self.subnode.append(node)
+            self.reset(compiled=True)
+
+        for lru in self.caches:
+            lru.clear()
 
         return self
 
@@ -211,16 +277,74 @@ class Node(str):
         """
         def add_err(handle):
             for code in codes:
-                self.codes[code] = (
-                    handle
-                    if iscoroutinefunction(handle) else
-                    coroutine(handle)
-                )
+                self.codes[code] = asyncfn(handle)
             return self
         return add_err
 
-    @coroutine
-    def trigger(self, req, res, code, message):
+    def compile(self):
+        """
+        Compile the node tree into a route index.
+            1. static subnode resolve by dict lookup.
+            2. `:param` and `:!rest` subnode as precomputed fallbacks.
+            3. `add` a subnode drop the index of the node.
+
+        - self                  self node.
+        """
+        fallback = {True: [], False: []}
+        static = {}
+        for node in self.subnode:
+            if node.startswith(":!"):
+                fallback[True].append(node)
+                fallback[False].append(node)
+            elif node.startswith(":"):
+                fallback[node.endswith("/")].append(node)
+            else:
+                static[node] = None
+
+        for name in static:
+            static[name] = tuple(
+                node for node in self.subnode
+                if node == name or (
+                    node.startswith(":") and (
+                        node.startswith(":!") or
+                        node.endswith("/") == name.endswith("/")
+                    )
+                )
+            )
+
+        self.compiled = (
+            static,
+            {k: tuple(v) for k, v in fallback.items()}
+        )
+
+        for node in self.subnode:
+            node.compile()
+
+        return self
+
+    def match(self, nextnode):
+        """
+        Subnodes match the branch, in order.
+
+        + nextnode<str>         branch.
+
+        - <iterable>            node objects.
+        """
+        if self.compiled is not None:
+            static, fallback = self.compiled
+            return static.get(nextnode) or fallback[nextnode.endswith("/")]
+
+        return (
+            node for node in self.subnode
+            if (
+                node.startswith(":!") or
+                node.endswith("/") == nextnode.endswith("/")
+                if node.startswith(":") else
+                node == nextnode
+            )
+        )
+
+    async def trigger(self, req, res, code, message):
         """
         Error trigger.
             &asyncio
@@ -233,28 +357,148 @@ class Node(str):
         - Result object.
         """
         res.status(code)
-        result = yield from (
-            self.codes if code in self.codes else codes
-        )[code](self, req, res, message)
+        handle = (self.codes if code in self.codes else codes)[code]
+        if self.metrics is not None:
+            self.metrics.trigger(code)
+        if self.sink is None:
+            return (await handle(self, req, res, message))
+
+        start = clock()
+        result = await handle(self, req, res, message)
+        self.sink.timing(TRIGGER, code, clock() - start)
         return result
 
-    @coroutine
-    def handler(self, req, res, branches):
+    def chain(self, method):
+        """
+        Classified handles of method.
+            built once, dropped by `all` and `add`.
+
+        + method<str>           `self.handles` key.
+
+        - <tuple>               (kind, handle) pairs.
+        - <None>                unknown method.
+        """
+        if self.chains is None:
+            self.chains = {
+                m: tuple(map(classify, handles))
+                for m, handles in self.handles.items()
+            }
+        return self.chains.get(method)
+
+    def resolve(self, branches):
+        """
+        Resolve route.
+            take the first matching subnode at each level.
+
+        + branches<Branches>    branches cursor.
+
+        - <tuple>               (node, rest name, rest value) steps.
+        """
+        route = []
+        node = self
+        while branches:
+            start = branches.index
+            nextnode = branches.pop()
+            for subnode in node.match(nextnode):
+                if subnode.startswith(":!"):
+                    route.append((
+                        subnode, subnode[2:], branches.path[start:]
+                    ))
+                elif subnode.startswith(":"):
+                    route.append((
+                        subnode, subnode[1:].rstrip("/"), nextnode.rstrip("/")
+                    ))
+                else:
+                    route.append((subnode, None, None))
+                node = subnode
+                break
+            else:
+                break
+        return tuple(route)
+
+    def lookup(self, req):
+        """
+        Resolve route of request,
+            through the LRU cache if `memoize` enabled.
+
+        + req               Request object.
+
+        - <tuple>           route steps.
+        """
+        if self.lru is None:
+            return self.resolve(copy(req.branches))
+
+        key = (req.method, req.path)
+        route = self.lru.get(key)
+        if route is None:
+            route = self.resolve(copy(req.branches))
+            self.lru.put(key, route)
+        return route
+
+    @classmethod
+    def instrument(cls, sink):
+        """
+        Enable timing of route resolution, handles, triggers and hooks.
+            1. sink is any object with `timing(kind, name, seconds)`,
+                eg: `isperdal.instrument.Histogram`, `StatsdSink`.
+            2. None disables, the default.
+
+        + sink              timing sink.
+        """
+        cls.sink = Response.sink = sink
+
+    def memoize(self, size=1024):
+        """
+        Enable route LRU cache.
+            1. keyed on (method, path).
+            2. cleared when any node `add` or `all`.
+
+        + size<int>         max entries.
+
+        - self              self node.
+        """
+        self.lru = LRU(size)
+        Node.caches.add(self.lru)
+        return self
+
+    async def handler(self, req, res, branches):
         """
         Request handle.
         """
+        result = await self.dispatch(req, res, self.resolve(branches))
+        return result
+
+    async def dispatch(self, req, res, route, depth=0):
+        """
+        Run handles along the resolved route.
+        """
+        sink = self.sink
         try:
-            if req.method not in self.handles:
+            chain = self.chain(req.method)
+            if chain is None:
                 raise res.status(400).err("Method can't understand.")
-            for handle in self.handles[req.method]:
-                if isinstance(handle, type):
-                    # and issubclass(handle, WebSocket):
+            for kind, handle in chain:
+                if sink is not None:
+                    start = clock()
+
+                if kind == SYNC:
+                    result = handle(self, req, res)
+                    # isawaitable is slow, skip the common results.
+                    if result is not None and not isinstance(result, Result):
+                        if isawaitable(result):
+                            result = await result
+                elif kind == ASYNC:
+                    result = await handle(self, req, res)
+                    # NOTE: why? Python 3.4- always returns None???
+                else:
                     if not req.env.get('websocket'):
                         continue
-                    result = yield from handle(self, req, res)()
-                else:
-                    result = yield from handle(self, req, res)
-                    # NOTE: why? Python 3.4- always returns None???
+                    result = await handle(self, req, res)()
+
+                if sink is not None:
+                    sink.timing(HANDLE, "{} {}".format(
+                        pattern(route, depth), label(handle)
+                    ), clock() - start)
 
                 if isinstance(result, Result):
                     if result.is_ok():
@@ -262,22 +506,13 @@ class Node(str):
                     else:
                         raise result
 
-            if branches:
-                nextnode = branches.pop(0)
-                for node in self.subnode:
-                    if node.startswith(":!"):
-                        req._rest[node[2:]] = "".join(
-                            [nextnode] + branches
-                        )
-                    elif node.startswith(":"):
-                        if node.endswith("/") != nextnode.endswith("/"):
-                            continue
-                        req._rest[node[1:].rstrip("/")] = nextnode.rstrip("/")
-                    elif nextnode != node:
-                        continue
-                    result = yield from node.handler(req, res, copy(branches))
-                    if isinstance(result, Ok):
-                        return result
+            if depth < len(route):
+                node, name, value = route[depth]
+                if name is not None:
+                    req._rest[name] = value
+                result = await node.dispatch(req, res, route, depth + 1)
+                if isinstance(result, Ok):
+                    return result
 
             if not res.done:
                 raise res.status(404).err("Not Found")
@@ -286,7 +521,7 @@ class Node(str):
 
         except Err as err:
             if res.status_code in self.codes:
-                result = yield from self.trigger(
+                result = await self.trigger(
                     req, res, res.status_code, err.err()
                 )
                 if isinstance(result, Ok):
@@ -294,28 +529,79 @@ class Node(str):
 
             raise err
 
-    @coroutine
-    def start(self, req, res):
+    async def start(self, req, res):
+        route = ()
+        metrics = self.metrics
+        if metrics is not None:
+            metrics.begin()
+            began = clock()
         try:
-            result = yield from self.handler(req, res, copy(req.branches))
+            if req.max_body is not None and (req.length or 0) > req.max_body:
+                raise TooLarge("Request Entity Too Large")
+            if self.sink is None:
+                route = self.lookup(req)
+            else:
+                start = clock()
+                route = self.lookup(req)
+                self.sink.timing(ROUTE, pattern(route), clock() - start)
+            result = await self.dispatch(req, res, route)
         except Exception as err:
+            if isinstance(err, Err) and getattr(err, 'status', None):
+                res.status(err.status)
             if isinstance(err, Err) and res.status_code in codes:
-                result = yield from self.trigger(
+                result = await self.trigger(
                     req, res, res.status_code, err.err()
                 )
             else:
-                result = yield from self.trigger(req, res, 500, format_exc())
+                result = await self.trigger(req, res, 500, format_exc())
+        finally:
+            if metrics is not None:
+                metrics.end(
+                    pattern(route), res.status_code or 200, clock() - began
+                )
 
         return result
 
-    def __call__(self, env, start_response):
-        req, res = Request(env), Response(start_response)
-        return async(unok(
+    def serve(self, req, res):
+        """
+        Serve a request from the root node.
+            &asyncio
+
+        + req               Request object.
+        + res               Response object.
+
+        - <iterable>        response body.
+        """
+        return unok(
             self.start(req, res)
-            if req.branches.pop(0) == self else
+            if req.branches.pop() == self else
             self.trigger(req, res, 400, "URL Error")
+        )
+
+    def __call__(self, env, start_response):
+        return ensure_future(iterable(
+            self.serve(Request(env), Response(start_response))
         ))
 
-    def run(self, host="127.0.0.1", port=8000, debug=True, ssl=()):
+    def run(
+        self, host="127.0.0.1", port=8000, debug=True, ssl=(),
+        max_body=None, sink=None, metrics=None, profiler=None, **options
+    ):
+        """
+        Run server.
+
+        + max_body<int>     max request body bytes, larger returns 413.
+        + sink              timing sink, see `Node.instrument`.
+        + metrics           `isperdal.metrics.Metrics` collector.
+        + profiler          `isperdal.profiler.Profiler`, toggled by SIGUSR2.
+        + **options         `AioHTTPServer` options.
+            eg: workers=4, native=True, loop='uvloop',
+                monitor=Monitor(threshold=0.05)
+        """
         Node.debug = debug
-        AioHTTPServer(host, port, debug, ssl).run(self.__call__)
+        Request.max_body = max_body
+        Node.instrument(sink)
+        Node.metrics = metrics
+        if profiler is not None:
+            profiler.install()
+        AioHTTPServer(host, port, debug, ssl, **options).run(self)
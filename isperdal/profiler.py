@@ -0,0 +1,164 @@
+from threading import Thread, Event, get_ident
+from collections import Counter
+from signal import signal, SIGUSR2
+import sys
+import os
+
+from .node import Node, pattern
+from .instrument import label
+
+
+DISPATCH = Node.dispatch.__code__
+
+
+def frame_name(frame):
+    """
+    >>> frame_name(sys._getframe())  # doctest: +ELLIPSIS
+    '<module> (<doctest ...>:1)'
+    """
+    code = frame.f_code
+    return "{} ({}:{})".format(
+        code.co_name, os.path.basename(code.co_filename), code.co_firstlineno
+    ).replace(";", ":")
+
+
+def tag(frame):
+    """
+    Route and handle of the innermost `Node.dispatch` on the stack.
+
+    - <tuple>       (route, handle)
+    - <None>        not handling a request.
+    """
+    while frame is not None:
+        if frame.f_code is DISPATCH:
+            local = frame.f_locals
+            req, route = local.get('req'), local.get('route')
+            handle = local.get('handle')
+            return (
+                "{} {}".format(
+                    getattr(req, 'method', '?'),
+                    pattern(route) if route is not None else '?'
+                ),
+                label(handle) if handle is not None else "-"
+            )
+        frame = frame.f_back
+    return None
+
+
+class Profiler(object):
+    """
+    Sampling profiler,
+        samples the stack of the event loop thread,
+        tagged with the route and handle being dispatched.
+        1. no cost on the request path, nothing sampled until started.
+        2. toggled by `SIGUSR2` once `install`ed, or the admin `node`.
+        3. output in collapsed stack format, eg: for flamegraph.pl.
+
+    eg:
+        profiler = Profiler()
+        app.add(profiler.node())
+        app.run(profiler=profiler)
+    """
+
+    def __init__(self, interval=0.005):
+        """
+        + interval<float>   seconds between samples.
+        """
+        self.interval = interval
+        self.samples = Counter()
+        self.ident = None
+        self.thread = None
+        self.stopped = Event()
+
+    @property
+    def running(self):
+        return self.thread is not None
+
+    def start(self):
+        """
+        Start sampling the calling thread, ie: the event loop thread.
+        """
+        if self.running:
+            return
+        self.ident = get_ident()
+        self.stopped.clear()
+        self.thread = Thread(target=self.loop, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        if not self.running:
+            return
+        self.stopped.set()
+        self.thread.join()
+        self.thread = None
+
+    def toggle(self, *_):
+        """
+        - <bool>        running.
+        """
+        self.stop() if self.running else self.start()
+        return self.running
+
+    def loop(self):
+        while not self.stopped.wait(self.interval):
+            self.sample()
+
+    def sample(self):
+        frame = sys._current_frames().get(self.ident)
+        if frame is None:
+            return
+        route, handle = tag(frame) or ("(loop)", "-")
+
+        stack = []
+        while frame is not None:
+            stack.append(frame_name(frame))
+            frame = frame.f_back
+        stack.extend((handle, route))
+        stack.reverse()
+        self.samples[";".join(stack)] += 1
+
+    def collapsed(self):
+        """
+        Samples in collapsed stack format.
+
+        - <str>         `route;handle;frame;...;frame count` lines.
+        """
+        return "".join(
+            "{} {}\n".format(stack, count)
+            for stack, count in sorted(self.samples.items())
+        )
+
+    def clear(self):
+        self.samples.clear()
+
+    def install(self, signum=SIGUSR2):
+        """
+        Toggle on signal,
+            each worker toggles its own profiler.
+        """
+        signal(signum, self.toggle)
+        return self
+
+    def node(self, name="profile"):
+        """
+        Admin endpoint, mount it on the tree.
+            GET samples, POST toggles, DELETE clears,
+            in the worker serving the request.
+
+        - <node>
+        """
+        def dump(this, req, res):
+            return res.header("Content-Type", "text/plain; charset=utf-8") \
+                .push(self.collapsed()).ok()
+
+        def toggle(this, req, res):
+            return res.push("on" if self.toggle() else "off").ok()
+
+        def clear(this, req, res):
+            self.clear()
+            return res.push("cleared").ok()
+
+        return Node(name) \
+            .all(('GET', 'HEAD'))(dump) \
+            .all(('POST',))(toggle) \
+            .all(('DELETE',))(clear)
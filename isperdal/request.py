@@ -1,16 +1,55 @@
-from cgi import FieldStorage
-from urllib.parse import parse_qs, unquote_plus
+from urllib.parse import parse_qs, unquote, unquote_plus
 from io import BytesIO
-from asyncio import coroutine
 
-from .utils import tobranch
+from .utils import Branches, Headers, Err, lazy
+from .forms import FormError, FormData, MultipartReader
+from .forms import parse_options, parse_multipart, parse_urlencoded
+
+
+class TooLarge(Err):
+    """
+    Request body exceeds `Request.max_body`.
+    """
+
+    status = 413
+
+
+class Chunks(object):
+    """
+    Request body chunks, async iterator.
+    """
+
+    def __init__(self, req, size):
+        self.req = req
+        self.size = size
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        chunk = await self.req.read(self.size)
+        if not chunk:
+            raise StopAsyncIteration
+        return chunk
 
 
 class Request(object):
     """
     Request class.
+        1. slotted, no per-instance dict.
+        2. `ext` holds middleware state, None until used.
     """
 
+    __slots__ = (
+        'env', 'method', 'uri', 'path', 'query_string', 'branches',
+        'stream', 'headers', 'received', 'ext',
+        '_rest', '_params', '_querys', '_forms', '_body'
+    )
+
+    max_body = None
+    max_part = None
+    spool = 1 << 20
+
     def __init__(self, env):
         """
         init Request.
@@ -21,14 +60,52 @@ class Request(object):
         self.method = env.get('REQUEST_METHOD', "GET").upper()
         self.uri = env.get('RAW_URI')
         self.path = env.get('PATH_INFO', "/")
-        self.branches = tobranch(self.path)
+        self.query_string = env.get('QUERY_STRING', "")
+        self.branches = Branches(self.path)
         self.stream = self.env.get('wsgi.input')
+        self.headers = (
+            Headers(env['isperdal.headers'].items())
+            if 'isperdal.headers' in env else
+            Headers.from_environ(env)
+        )
+        self.received = 0
+        self.ext = None
 
         self._rest = {}
+        self._params = {}
+        self._querys = None
+        self._forms = None
+
+    @classmethod
+    def from_message(cls, message, payload, env):
+        """
+        init Request from parsed HTTP message, bypass WSGI env.
+
+        + message       aiohttp RawRequestMessage.
+        + payload       request stream.
+        + env<dict>     extra env, eg: REMOTE_ADDR, wsgi.url_scheme.
+        """
+        req = cls.__new__(cls)
+        req.env = env
+        req.method = message.method.upper()
+        req.uri = message.path
+        path, _, req.query_string = message.path.partition('?')
+        # decoded, as WSGI PATH_INFO.
+        req.path = unquote(path)
+        req.branches = Branches(req.path)
+        req.stream = payload
+        req.headers = Headers(message.headers.items())
+        req.received = 0
+        req.ext = None
+
+        req._rest = {}
+        req._params = {}
+        req._querys = None
+        req._forms = None
+        return req
 
     @property
-    @coroutine
-    def body(self):
+    async def body(self):
         """
         Request body IO.
             &asyncio
@@ -40,37 +117,91 @@ class Request(object):
             self._body = BytesIO()
 
         self._body.seek(0, 2)
-        self._body.write((yield from self.stream.read()) or b"")
+        while True:
+            chunk = await self.read()
+            if not chunk:
+                break
+            self._body.write(chunk)
         self._body.seek(0)
 
         return self._body
 
-    @coroutine
-    def rest(self, name):
+    @property
+    def length(self):
+        """
+        Request Content-Length.
+
+        - <int>
+        - <None>
+        """
+        try:
+            return int(self.headers.get('Content-Length'))
+        except (TypeError, ValueError):
+            return None
+
+    async def read(self, size=1 << 16):
+        """
+        Read a chunk of request body.
+            &asyncio
+            1. raise TooLarge past `max_body`.
+
+        + size<int>     max chunk size.
+
+        - <bytes>       b"" when drained.
+        """
+        chunk = (
+            (await self.stream.read(size)) or b""
+            if self.stream is not None else
+            b""
+        )
+        self.received += len(chunk)
+        if self.max_body is not None and self.received > self.max_body:
+            raise TooLarge("Request Entity Too Large")
+        return chunk
+
+    def chunks(self, size=1 << 16):
+        """
+        Request body chunks.
+            eg: async for chunk in req.chunks(): ...
+
+        + size<int>     max chunk size.
+
+        - <Chunks>      async iterator.
+        """
+        return Chunks(self, size)
+
+    async def rest(self, name):
         """
         Request REST style param.
             &asyncio
             1. param values allowed to be overwritten.
+            2. decoded once per value.
 
         + name<str>     param name
 
         - <str>         param value
         - <None>
         """
-        return unquote_plus(self._rest.get(name, '')) or None
+        value = self._rest.get(name)
+        if not value:
+            return None
+        raw, decoded = self._params.get(name, (None, None))
+        if raw is not value:
+            decoded = unquote_plus(value) or None
+            self._params[name] = (value, decoded)
+        return decoded
 
-    @property
-    @coroutine
-    def querys(self):
-        if not hasattr(self, '__querys'):
-            self.__querys = parse_qs(
-                self.env.get('QUERY_STRING'),
-                keep_blank_values=True
-            )
-        return self.__querys
-
-    @coroutine
-    def query(self, name):
+    @lazy('_querys')
+    async def querys(self):
+        """
+        Request query params, parsed once.
+            &asyncio
+
+        - <dict>        name: [values].
+        """
+        return parse_qs(self.query_string, keep_blank_values=True)
+
+    async def query(self, name):
         """
         Request query param.
             &asyncio
@@ -79,58 +210,87 @@ class Request(object):
         ...
         """
         return (lambda f=None, *_: f)(*(
-            yield from self.querys
+            await self.querys
         ).get(name, [None]))
 
-    @coroutine
-    def header(self, name):
+    async def header(self, name):
         """
         Request header param.
             &asyncio
-            1. Priority resolve HTTP_NAME format head.
-                eg: HTTP_USER_AGENT
+            1. first value of multi-valued header,
+                all values in `req.headers.getall(name)`.
             2. Automatic conversion case.
         ...
         """
-        name = name.replace('-', '_').upper()
-        return self.env.get("HTTP_{}".format(name))
+        return self.headers.get(name)
 
-    @property
-    @coroutine
-    def forms(self):
-        if not hasattr(self, '__forms'):
-            safe_env = {'QUERY_STRING': ""}
-            for key in ('REQUEST_METHOD', 'CONTENT_TYPE', 'CONTENT_LENGTH'):
-                if key in self.env:
-                    safe_env[key] = self.env[key]
-            fs = FieldStorage(
-                fp=(yield from self.body),
-                environ=safe_env,
-                keep_blank_values=True
-            )
-            self.__forms = fs
-        return self.__forms
-
-    @coroutine
-    def form(self, name):
+    @lazy('_forms')
+    async def forms(self):
+        """
+        Request form, parsed once.
+            &asyncio
+            1. multipart file parts spill to disk past `spool` bytes.
+            2. parts larger than `max_part` raise 413.
+
+        - <FormData>
+        """
+        ctype, options = parse_options(
+            (await self.header('Content-Type')) or ""
+        )
+        read = self.read
+        if hasattr(self, '_body'):
+            body = await self.body
+
+            async def read(size=1 << 16):
+                return body.read(size)
+
+        if ctype == 'multipart/form-data' and options.get('boundary'):
+            return (await parse_multipart(
+                read, options['boundary'].encode('latin-1'),
+                self.max_part, self.spool
+            ))
+        elif ctype == 'application/x-www-form-urlencoded':
+            return (await parse_urlencoded(
+                read, self.max_part, options.get('charset', "utf-8")
+            ))
+        return FormData()
+
+    async def parts(self):
+        """
+        Request multipart parts, as streams.
+            &asyncio
+            eg: async for part in (await req.parts()):
+                    async for chunk in part: ...
+
+        - <MultipartReader>
+        """
+        ctype, options = parse_options(
+            (await self.header('Content-Type')) or ""
+        )
+        if ctype != 'multipart/form-data' or not options.get('boundary'):
+            raise FormError("Not multipart/form-data")
+        return MultipartReader(
+            self.read, options['boundary'].encode('latin-1'), self.max_part
+        )
+
+    async def form(self, name):
         """
         Request form param.
             &asyncio
             1. always returns the first argument.
         ...
         """
-        return (yield from self.forms).getfirst(name)
+        return (await self.forms).getfirst(name)
 
-    @coroutine
-    def parm(self, name):
+    async def parm(self, name):
         """
         Request all param.
             &asyncio
         ...
         """
         return (
-            (yield from self.rest(name)) or
-            (yield from self.query(name)) or
-            (yield from self.form(name)) or
+            (await self.rest(name)) or
+            (await self.query(name)) or
+            (await self.form(name)) or
             None
         )
@@ -1,11 +1,119 @@
-from .utils import Ok, Err, resp_status
+from asyncio import ensure_future
+from inspect import isawaitable
+from time import perf_counter as clock
+
+from .utils import Ok, Err, resp_status, to_bytes
+from .instrument import HOOK, label
+
+
+class Stream(object):
+    """
+    Stream body.
+        items are str or bytes, or awaitables of them.
+    """
+
+    def __init__(self, source):
+        """
+        init Stream.
+
+        + source        iterable, or async iterable.
+        """
+        if hasattr(source, '__aiter__'):
+            self.source = source.__aiter__()
+            self.aiter = True
+        else:
+            self.source = iter(source)
+            self.aiter = False
+        self.pending = None
+
+    async def read(self):
+        """
+        Read next chunk.
+            &asyncio
+            1. skip empty chunk.
+
+        - <bytes>
+        - <None>        drained.
+        """
+        while True:
+            if self.aiter:
+                try:
+                    chunk = await self.source.__anext__()
+                except StopAsyncIteration:
+                    return None
+            else:
+                chunk = next(self.source, None)
+                if chunk is None:
+                    return None
+                if isawaitable(chunk):
+                    chunk = await chunk
+
+            if chunk:
+                return chunk.encode() if isinstance(chunk, str) else chunk
+
+    async def sendfile(self, writer, loop):
+        """
+        Zero-copy send to the transport, if the stream allows.
+            &asyncio
+
+        + writer        stream writer.
+        + loop          event loop.
+
+        - <bool>        sent.
+        """
+        return False
+
+    async def prime(self):
+        """
+        Prefetch first chunk, for WSGI iteration.
+            &asyncio
+        """
+        self.pending = await self.read()
+
+    async def advance(self):
+        chunk, self.pending = self.pending, (await self.read())
+        return chunk
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        """
+        WSGI iteration, futures of chunk.
+            the next chunk is prefetched before the future is done,
+            so the end is known without an empty chunk.
+        """
+        if self.pending is None:
+            raise StopIteration
+        return ensure_future(self.advance())
+
+
+async def iterable(body):
+    """
+    WSGI body.
+        &asyncio
+        prime stream body.
+    """
+    body = await body
+    if isinstance(body, Stream):
+        await body.prime()
+    return body
 
 
 class Response(object):
     """
     Response class.
+        1. slotted, no per-instance dict.
+        2. `ext` holds middleware state, None until used.
     """
 
+    __slots__ = (
+        'start_response', 'headers', 'body', 'length', 'hooks',
+        'status_code', 'status_text', 'done', 'ext'
+    )
+
+    sink = None
+
     def __init__(self, start_response):
         """
         init Response.
@@ -15,10 +123,12 @@ class Response(object):
         self.start_response = start_response
         self.headers = {}
         self.body = []
+        self.length = 0
         self.hooks = []
         self.status_code = 0
         self.status_text = None
         self.done = False
+        self.ext = None
 
     def status(self, code, text=None):
         """
@@ -50,20 +160,32 @@ class Response(object):
         Push content to body.
 
         + body<str>         body string.
-            or bytes.
+            or bytes, others raise TypeError.
 
         ...
         """
         if body:
-            if isinstance(body, str):
-                body = body.encode()
+            body = to_bytes(body)
 
-            self.body.extend((
-                lambda b: [b[r:r+8192] for r in range(0, len(b), 8192)]
-            )(body))
+            # one segment per push, no copy.
+            self.body.append(body)
+            self.length += len(body)
 
         return self
 
+    def stream(self, source):
+        """
+        Stream content to body.
+            chunks are sent as they come, without buffering.
+
+        + source        iterable, or async iterable.
+            items are str or bytes, or awaitables of them.
+
+        ...
+        """
+        self.body = source if isinstance(source, Stream) else Stream(source)
+        return self
+
     def hook(self, fn):
         """
         Response hook.
@@ -80,15 +202,39 @@ class Response(object):
         """
         Complete a response.
             return iterables object or `res.body`.
+            1. `T` replaces `res.body`.
+            2. set Content-Length of `res.body`, if not stream,
+                unless set, or the status has no body, 1xx 204 304.
 
         + T                 iterables or coroutine
 
         - <Ok>
         """
         if not self.done:
+            sink = self.sink
             for fn in self.hooks:
-                fn(self)
+                if sink is None:
+                    fn(self)
+                else:
+                    start = clock()
+                    fn(self)
+                    sink.timing(HOOK, label(fn), clock() - start)
             self.done = True
+            if T is not None:
+                self.body = T
+
+            if (
+                T is None and
+                not isinstance(self.body, Stream) and
+                not (
+                    100 <= self.status_code < 200 or
+                    self.status_code in (204, 304)
+                ) and
+                not any(
+                    name.lower() == 'content-length' for name in self.headers
+                )
+            ):
+                self.headers['Content-Length'] = str(self.length)
 
             self.start_response(
                 resp_status(self.status_code, self.status_text),
@@ -0,0 +1,206 @@
+from email.utils import formatdate, parsedate_tz, mktime_tz
+from mimetypes import guess_type
+from mmap import mmap, ACCESS_READ
+from stat import S_ISREG
+import os
+
+from .response import Stream
+
+
+class FileStream(Stream):
+    """
+    File body.
+        1. `sendfile` to the socket, if the transport allows.
+        2. or mmap chunks, eg: TLS, WSGI.
+    """
+
+    def __init__(self, path, offset, count, chunk=1 << 16):
+        """
+        init FileStream.
+
+        + path<str>         file path.
+        + offset<int>       start offset.
+        + count<int>        bytes to send.
+        + chunk<int>        mmap chunk size.
+        """
+        self.path = path
+        self.offset = offset
+        self.count = count
+        self.chunk = chunk
+        super().__init__(self.chunks())
+
+    def chunks(self):
+        if not self.count:
+            return
+        with open(self.path, 'rb') as fd:
+            with mmap(fd.fileno(), 0, access=ACCESS_READ) as buf:
+                end = self.offset + self.count
+                for offset in range(self.offset, end, self.chunk):
+                    yield buf[offset:min(offset + self.chunk, end)]
+
+    async def sendfile(self, writer, loop):
+        if not self.count:
+            # nothing to send, `loop.sendfile` rejects count=0.
+            return True
+
+        transport = writer.transport
+        if hasattr(loop, 'sendfile'):
+            with open(self.path, 'rb') as fd:
+                await loop.sendfile(
+                    transport, fd, self.offset, self.count
+                )
+            return True
+
+        sock = transport.get_extra_info('socket')
+        if (
+            sock is None or
+            transport.get_extra_info('sslcontext') is not None or
+            not hasattr(os, 'sendfile')
+        ):
+            return False
+
+        # flush the buffered headers first.
+        transport.set_write_buffer_limits(0)
+        await writer.drain()
+        transport.set_write_buffer_limits()
+
+        with open(self.path, 'rb') as fd:
+            offset, count = self.offset, self.count
+            while count:
+                try:
+                    sent = os.sendfile(
+                        sock.fileno(), fd.fileno(), offset, count
+                    )
+                except BlockingIOError:
+                    await writable(loop, sock.fileno())
+                    continue
+                if not sent:
+                    break
+                offset += sent
+                count -= sent
+
+        return True
+
+
+async def writable(loop, fd):
+    future = loop.create_future()
+    loop.add_writer(fd, future.set_result, None)
+    try:
+        await future
+    finally:
+        loop.remove_writer(fd)
+
+
+def byterange(value, size):
+    """
+    >>> byterange("bytes=0-99", 1000)
+    (0, 100)
+    >>> byterange("bytes=900-", 1000)
+    (900, 100)
+    >>> byterange("bytes=-100", 1000)
+    (900, 100)
+    >>> byterange("bytes=0-1999", 1000)
+    (0, 1000)
+    >>> byterange("bytes=1000-", 1000)
+    >>> byterange("bytes=0-1,4-5", 1000)
+    >>> byterange("items=0-1", 1000)
+    """
+    unit, _, spec = value.partition("=")
+    if unit.strip() != "bytes" or "," in spec:
+        return None
+    start, _, end = spec.strip().partition("-")
+    try:
+        if not start:
+            count = min(int(end), size)
+            return (size - count, count) if count else None
+        start = int(start)
+        end = min(int(end), size - 1) if end else size - 1
+    except ValueError:
+        return None
+    if start > end:
+        return None
+    return start, end - start + 1
+
+
+def static(root, name='path', chunk=1 << 16):
+    """
+    Static files handle.
+        mount under a `:!` rest node, eg:
+            app.append([u('static/'), u(':!path')])(static('/var/www'))
+        1. ETag and Last-Modified, conditional GET returns 304.
+        2. single bytes Range returns 206, or 416.
+            multiple ranges are ignored.
+
+    + root<str>         directory.
+    + name<str>         rest param name.
+    + chunk<int>        mmap chunk size.
+
+    - <function>        handle function.
+    """
+    root = os.path.realpath(root)
+
+    async def static_handle(this, req, res):
+        # raw param, the path is already decoded once.
+        path = os.path.realpath(
+            os.path.join(root, req._rest.get(name) or "")
+        )
+        if os.path.commonpath([root, path]) != root:
+            return res.status(404).err("Not Found")
+        try:
+            st = os.stat(path)
+        except OSError:
+            return res.status(404).err("Not Found")
+        if not S_ISREG(st.st_mode):
+            return res.status(404).err("Not Found")
+
+        size, mtime = st.st_size, int(st.st_mtime)
+        etag = '"{:x}-{:x}"'.format(mtime, size)
+        last_modified = formatdate(mtime, usegmt=True)
+        res.header('ETag', etag)
+        res.header('Last-Modified', last_modified)
+        res.header('Accept-Ranges', "bytes")
+
+        none_match = await req.header('If-None-Match')
+        modified_since = await req.header('If-Modified-Since')
+        if none_match is not None:
+            not_modified = none_match.strip() == "*" or etag in (
+                tag.strip() for tag in none_match.split(",")
+            )
+        elif modified_since is not None:
+            since = parsedate_tz(modified_since)
+            not_modified = since is not None and mktime_tz(since) >= mtime
+        else:
+            not_modified = False
+        if not_modified:
+            return res.status(304).header('Content-Length', str(size)).ok()
+
+        offset, count = 0, size
+        ranges = await req.header('Range')
+        if_range = await req.header('If-Range')
+        if (
+            ranges is not None and
+            if_range in (None, etag, last_modified) and
+            ranges.startswith("bytes=") and
+            "," not in ranges
+        ):
+            bounds = byterange(ranges, size)
+            if bounds is None:
+                return res.status(416).header(
+                    'Content-Range', "bytes */{}".format(size)
+                ).ok()
+            offset, count = bounds
+            res.status(206).header(
+                'Content-Range',
+                "bytes {}-{}/{}".format(offset, offset + count - 1, size)
+            )
+
+        res.header(
+            'Content-Type',
+            guess_type(path)[0] or "application/octet-stream"
+        )
+        res.header('Content-Length', str(count))
+        if req.method != 'HEAD':
+            res.stream(FileStream(path, offset, count, chunk))
+        return res.ok()
+
+    return static_handle
@@ -1,6 +1,9 @@
-from asyncio import coroutine, get_event_loop
+from asyncio import get_event_loop, iscoroutinefunction
+from inspect import isawaitable, isgeneratorfunction
+from copy import copy
+from collections import OrderedDict
 from http.client import responses
-from types import MethodType
+from types import MethodType, coroutine
 from functools import wraps
 
 
@@ -47,7 +50,7 @@ class Result(object):
         >>> Ok(1).is_err()
         False
         """
-        return type(self) == Err
+        return isinstance(self, Err)
 
     def ok(self):
         """
@@ -107,34 +110,279 @@ class Err(Result, Exception):
         return False
 
 
-@coroutine
-def unok(fn):
+async def unok(fn):
     """
-    >>> from asyncio import coroutine, get_event_loop
+    >>> from asyncio import get_event_loop
     >>> loop = get_event_loop()
-    >>> loop.run_until_complete(unok(coroutine(
-    ...     lambda: Ok(True)
-    ... )()))
+    >>> async def foo(value):
+    ...     return Ok(value)
+    >>> loop.run_until_complete(unok(foo(True)))
     True
-    >>> loop.run_until_complete(unok(coroutine(
-    ...     lambda: Ok(False)
-    ... )()))
+    >>> loop.run_until_complete(unok(foo(False)))
     False
     """
-    return (yield from fn).ok()
+    return (await fn).ok()
 
 
-def tobranch(path):
+async def awaited(result):
     """
-    >>> tobranch("/one")
+    Await result if awaitable, or else returns it.
+
+    >>> loop = get_event_loop()
+    >>> async def foo():
+    ...     return 1
+    >>> [loop.run_until_complete(awaited(r)) for r in (foo(), 1)]
+    [1, 1]
+    """
+    if isawaitable(result):
+        return await result
+    return result
+
+
+def asyncfn(fn):
+    """
+    Native coroutine function,
+        of sync, generator or coroutine function.
+
+    >>> loop = get_event_loop()
+    >>> def foo():
+    ...     return (yield from asyncfn(lambda: 1)())
+    >>> loop.run_until_complete(asyncfn(foo)())
+    1
+    """
+    if iscoroutinefunction(fn):
+        return fn
+    if isgeneratorfunction(fn):
+        return coroutine(fn)
+
+    @wraps(fn)
+    async def async_fn(*args, **kwargs):
+        return await awaited(fn(*args, **kwargs))
+    return async_fn
+
+
+class Branches(object):
+    """
+    Branches cursor,
+        offsets into the path, instead of a list of branch.
+
+    >>> list(Branches("/one"))
     ['/', 'one']
-    >>> tobranch("/two/")
+    >>> list(Branches("/two/"))
     ['/', 'two/', '']
-    >>> tobranch("//")
+    >>> list(Branches("//"))
     ['/', '/', '']
+
+    >>> branches = Branches("/two/")
+    >>> branches.pop()
+    '/'
+    >>> list(branches), branches.rest()
+    (['two/', ''], 'two/')
+    >>> branches.pop(), branches.pop(), bool(branches)
+    ('two/', '', False)
+    """
+
+    __slots__ = ('path', 'index')
+
+    def __init__(self, path, index=0):
+        self.path = path
+        self.index = index
+
+    def __bool__(self):
+        return self.index <= len(self.path)
+
+    def __copy__(self):
+        return Branches(self.path, self.index)
+
+    def __iter__(self):
+        branches = copy(self)
+        while branches:
+            yield branches.pop()
+
+    def pop(self):
+        """
+        Next branch, and move the cursor.
+
+        - <str>
+        """
+        end = self.path.find('/', self.index) + 1 or len(self.path) + 1
+        branch = self.path[self.index:end]
+        self.index = end
+        return branch
+
+    def rest(self):
+        """
+        Rest of the path, from the cursor.
+
+        - <str>
+        """
+        return self.path[self.index:]
+
+
+class Headers(object):
+    """
+    Case-insensitive, multi-valued request headers,
+        index built on first access.
+
+    >>> headers = Headers([
+    ...     ('Accept', 'text/html'), ('ACCEPT', '*/*'), ('User-Agent', 'x')
+    ... ])
+    >>> headers.get('accept'), headers['user_agent']
+    ('text/html', 'x')
+    >>> headers.getall('Accept')
+    ['text/html', '*/*']
+    >>> 'Cookie' in headers, headers.get('Cookie'), headers.getall('Cookie')
+    (False, None, [])
+    >>> headers = Headers.from_environ({
+    ...     'HTTP_USER_AGENT': 'x', 'CONTENT_TYPE': 'text/plain'
+    ... })
+    >>> headers.get('Content-Type'), headers.get('User-Agent')
+    ('text/plain', 'x')
+    """
+
+    __slots__ = ('source', 'index')
+
+    def __init__(self, items):
+        """
+        + items<iterable>       (name, value) pairs, consumed lazily.
+        """
+        self.source = items
+        self.index = None
+
+    @classmethod
+    def from_environ(cls, env):
+        """
+        Headers of WSGI env, `HTTP_*` and CONTENT_TYPE/CONTENT_LENGTH.
+        """
+        return cls(
+            (key[5:] if key.startswith('HTTP_') else key, value)
+            for key, value in env.items()
+            if key.startswith('HTTP_') or (
+                key in ('CONTENT_TYPE', 'CONTENT_LENGTH') and value
+            )
+        )
+
+    @staticmethod
+    def key(name):
+        return name.replace('_', '-').lower()
+
+    def build(self):
+        if self.index is None:
+            self.index = {}
+            for name, value in self.source:
+                self.index.setdefault(self.key(name), []).append(value)
+            self.source = None
+        return self.index
+
+    def get(self, name, default=None):
+        values = self.build().get(self.key(name))
+        return values[0] if values else default
+
+    def getall(self, name):
+        return list(self.build().get(self.key(name), ()))
+
+    def __getitem__(self, name):
+        values = self.build().get(self.key(name))
+        if not values:
+            raise KeyError(name)
+        return values[0]
+
+    def __contains__(self, name):
+        return self.key(name) in self.build()
+
+    def __iter__(self):
+        return iter(self.build())
+
+    def __len__(self):
+        return len(self.build())
+
+    def items(self):
+        return [
+            (name, value)
+            for name, values in self.build().items()
+            for value in values
+        ]
+
+
+class LRU(object):
+    """
+    Least recently used cache.
+        bounded by items, or by total weight of `weigh`.
+
+    >>> lru = LRU(2)
+    >>> lru.put('a', 1)
+    >>> lru.put('b', 2)
+    >>> lru.get('a')
+    1
+    >>> lru.put('c', 3)
+    >>> lru.get('b') is None
+    True
+    >>> len(lru), lru.hits, lru.misses, lru.evictions
+    (2, 1, 1, 1)
+
+    >>> lru = LRU(5, weigh=len)
+    >>> lru.put('a', "xx")
+    >>> lru.put('b', "xxx")
+    >>> lru.put('c', "x")
+    >>> list(lru.items), lru.weight
+    (['b', 'c'], 4)
+    >>> lru.put('d', "xxxxxx")
+    >>> lru.pop('b'), list(lru.items), lru.weight
+    ('xxx', ['c'], 1)
     """
-    pathsplit = path.split('/')
-    return ["{}/".format(p) for p in pathsplit[:-1]] + pathsplit[-1:]
+
+    def __init__(self, size, weigh=None):
+        """
+        + size<int>         max items, or max weight.
+        + weigh<fn>         weight of a value.
+        """
+        self.size = size
+        self.weigh = weigh
+        self.weight = 0
+        self.items = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def cost(self, value):
+        return 1 if self.weigh is None else self.weigh(value)
+
+    def __len__(self):
+        return len(self.items)
+
+    def get(self, key, default=None):
+        try:
+            value = self.items[key]
+        except KeyError:
+            self.misses += 1
+            return default
+        self.items.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        self.pop(key)
+        cost = self.cost(value)
+        if cost > self.size:
+            # never fits, not worth evicting everything else.
+            return
+        self.items[key] = value
+        self.weight += cost
+        while self.weight > self.size:
+            _, old = self.items.popitem(last=False)
+            self.weight -= self.cost(old)
+            self.evictions += 1
+
+    def pop(self, key, default=None):
+        if key not in self.items:
+            return default
+        value = self.items.pop(key)
+        self.weight -= self.cost(value)
+        return value
+
+    def clear(self):
+        self.items.clear()
+        self.weight = 0
 
 
 def resp_status(status_code, status_text=None):
@@ -157,6 +405,127 @@ def resp_status(status_code, status_text=None):
     )
 
 
+def to_bytes(body):
+    """
+    Body segment, str is encoded.
+
+    >>> to_bytes("ok")
+    b'ok'
+    >>> to_bytes(b"ok")
+    b'ok'
+    >>> to_bytes(bytearray(b"ok"))
+    Traceback (most recent call last):
+        ...
+    TypeError: body must be str or bytes, not bytearray
+    """
+    if isinstance(body, str):
+        return body.encode()
+    if not isinstance(body, bytes):
+        raise TypeError("body must be str or bytes, not {}".format(
+            type(body).__name__
+        ))
+    return body
+
+
+def lazy(slot):
+    """
+    Lazy property,
+        &asyncio
+        computed once per object, kept in `slot` (None until computed).
+
+    >>> class Foo:
+    ...     __slots__ = ('_bar', 'count')
+    ...     def __init__(self):
+    ...         self._bar = None
+    ...         self.count = 0
+    ...     @lazy('_bar')
+    ...     async def bar(self):
+    ...         self.count += 1
+    ...         return "BAR"
+    >>> foo = Foo()
+    >>> loop = get_event_loop()
+    >>> loop.run_until_complete(foo.bar), loop.run_until_complete(foo.bar)
+    ('BAR', 'BAR')
+    >>> foo.count
+    1
+    """
+    def lazy_wrap(fn):
+        @wraps(fn)
+        async def lazy_get(self):
+            value = getattr(self, slot)
+            if value is None:
+                value = await fn(self)
+                setattr(self, slot, value)
+            return value
+        return property(lazy_get)
+    return lazy_wrap
+
+
+def extend(target, name=None):
+    """
+    Register an extension method on a class, once at startup,
+        instead of mounting it on every object.
+        1. name defaults to the function name.
+        2. refuses to shadow an attribute defined elsewhere.
+
+    >>> class Bar:
+    ...     __slots__ = ('ext',)
+    ...     def __init__(self):
+    ...         self.ext = None
+    >>> @extend(Bar)
+    ... def hits(self):
+    ...     state(self, 'hits', list).append(1)
+    ...     return len(state(self, 'hits', list))
+    >>> bar = Bar()
+    >>> bar.ext is None
+    True
+    >>> bar.hits(), bar.hits(), Bar().hits()
+    (1, 2, 1)
+    >>> @extend(Bar, 'hits')  # doctest: +ELLIPSIS
+    ... def other(self):
+    ...     pass
+    Traceback (most recent call last):
+        ...
+    AttributeError: Bar.hits already defined in ...hits
+    """
+    def origin(fn):
+        fn = getattr(fn, 'fget', fn)
+        return "{}.{}".format(
+            getattr(fn, '__module__', None),
+            getattr(fn, '__qualname__', None)
+        )
+
+    def extend_wrap(fn):
+        attr = name or getattr(fn, 'fget', fn).__name__
+        if attr in vars(target) and origin(vars(target)[attr]) != origin(fn):
+            raise AttributeError("{}.{} already defined in {}".format(
+                target.__name__, attr, origin(vars(target)[attr])
+            ))
+        setattr(target, attr, fn)
+        return fn
+    return extend_wrap
+
+
+def state(obj, key, factory=dict):
+    """
+    Extension state of an object,
+        kept in its `ext` slot, created on first access.
+
+    + obj           object with `ext` slot, eg: Request, Response.
+    + key<str>      extension name.
+    + factory<fn>   create the state.
+
+    - <T>
+    """
+    if obj.ext is None:
+        obj.ext = {}
+    try:
+        return obj.ext[key]
+    except KeyError:
+        value = obj.ext[key] = factory()
+        return value
+
+
 def mount(target, method, static=False):
     """
     >>> class Bar:
@@ -194,18 +563,19 @@ def aiotest(fn):
     ...     assert bar == "BAR"
     >>> foo("BAR")
 
-    >>> @coroutine
-    ... def baz():
+    >>> async def baz():
     ...     return "BAZ"
     >>> @aiotest
-    ... def foo2(baz):
-    ...     return (yield from baz())
+    ... async def foo2(baz):
+    ...     return await baz()
 
     >>> foo2(baz)
     'BAZ'
     """
     @wraps(fn)
     def aio_wrap(*args, **kwargs):
-        loop = get_event_loop()
-        return loop.run_until_complete(coroutine(fn)(*args, **kwargs))
+        result = fn(*args, **kwargs)
+        if isawaitable(result):
+            result = get_event_loop().run_until_complete(result)
+        return result
     return aio_wrap
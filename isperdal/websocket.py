@@ -1,4 +1,3 @@
-from asyncio import coroutine
 from functools import partial
 
 from aiohttp.websocket import (
@@ -8,7 +7,7 @@ from aiohttp.websocket import (
     MSG_CLOSE
 )
 
-from .utils import resp_status
+from .utils import resp_status, asyncfn, awaited
 
 
 class Close(Exception):
@@ -36,20 +35,19 @@ class WebSocket(object):
     def close(self):
         raise Close()
 
-    @coroutine
-    def __call__(self):
-        yield from self.on_handshake()
-        yield from self.on_connect()
+    async def __call__(self):
+        await self.on_handshake()
+        await self.on_connect()
 
         while True:
             try:
-                message = yield from self.wsqueue.read()
+                message = await self.wsqueue.read()
             except:
                 # client dropped connection
                 break
 
             try:
-                yield from partial(
+                await awaited(partial(
                     {
                         MSG_PING: self.on_ping,
                         MSG_TEXT: self.on_message,
@@ -57,21 +55,20 @@ class WebSocket(object):
                         MSG_CLOSE: self.on_close
                     }.get(
                         message.tp,
-                        coroutine(lambda: None)
+                        asyncfn(lambda: None)
                     ),
 
                     *{
                         MSG_TEXT: [message.data],
                         MSG_BINARY: [message.data]
                     }.get(message.tp, [])
-                )()
+                )())
 
             except Close:
                 break
 
-    @coroutine
-    def on_handshake(self):
-        for fn in self.res.hook:
+    async def on_handshake(self):
+        for fn in self.res.hooks:
             fn(self.res)
         self.res.start_response(
             resp_status(self.res.status_code or self.status),
@@ -80,18 +77,14 @@ class WebSocket(object):
 
         self.wsqueue = self.reader.set_parser(self.parser)
 
-    @coroutine
-    def on_connect(self):
+    async def on_connect(self):
         pass
 
-    @coroutine
-    def on_ping(self):
+    async def on_ping(self):
         self.pong()
 
-    @coroutine
-    def on_message(self, message):
+    async def on_message(self, message):
         pass
 
-    @coroutine
-    def on_close(self):
+    async def on_close(self):
         self.close()
@@ -0,0 +1,350 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+from asyncio import new_event_loop, get_event_loop, set_event_loop
+from asyncio import open_connection, wait_for, sleep as aiosleep
+from multiprocessing import Process
+from tempfile import mkdtemp
+from shutil import rmtree
+from signal import SIGKILL, SIGHUP, SIGTERM
+from time import sleep
+import os
+
+from isperdal import Node as u
+from isperdal.adapter import Connections, AioHTTPServer
+from isperdal.utils import aiotest
+
+
+class fakeTransport:
+    def __init__(self):
+        self.reading = True
+
+    def pause_reading(self):
+        self.reading = False
+
+    def resume_reading(self):
+        self.reading = True
+
+    def close(self):
+        self.closed = True
+
+
+class fakeProtocol:
+    def __init__(self):
+        self.transport = fakeTransport()
+
+
+class TestConnections:
+    def test_limit(self):
+        connections = Connections(1, queue=2)
+        first, second, third = fakeProtocol(), fakeProtocol(), fakeProtocol()
+
+        connections.add(first)
+        connections.add(second)
+        connections.add(third)
+        assert len(connections) == 3
+        assert first.transport.reading
+        assert not second.transport.reading
+
+        connections.discard(second)
+        assert len(connections) == 2
+
+        connections.discard(first)
+        assert third.transport.reading
+        assert list(connections) == [third]
+
+    @aiotest
+    async def test_overflow(self):
+        connections = Connections(1, wait=0.05)
+        first, second, third = fakeProtocol(), fakeProtocol(), fakeProtocol()
+
+        for protocol in (first, second, third):
+            connections.add(protocol)
+        assert list(connections) == [first, second]
+        assert third.transport.closed
+
+        await aiosleep(0.1)
+        assert second.transport.closed
+        assert list(connections) == [first]
+
+    @aiotest
+    async def test_refused(self):
+        server = AioHTTPServer(
+            '127.0.0.1', 0, False, None,
+            grace=0, keep_alive=0.2, max_connections=1
+        )
+        root = u('/').get(u('ping'))(
+            lambda this, req, res: res.push("ok").ok()
+        )
+        srv, connections = await server.start(root)
+        address = srv.sockets[0].getsockname()[:2]
+
+        clients = []
+        for _ in range(4):
+            clients.append(await open_connection(*address))
+            await aiosleep(0.02)
+        assert len(connections) == 2
+
+        # beyond the queue, closed at once.
+        for reader, _ in clients[2:]:
+            assert (await wait_for(reader.read(), 1)) == b""
+
+        # the paused one is reaped.
+        reader, _ = clients[1]
+        assert (await wait_for(reader.read(), 1)) == b""
+        assert len(connections) == 1
+
+        reader, writer = clients[0]
+        writer.write(b"GET /ping HTTP/1.1\r\nConnection: close\r\n\r\n")
+        assert (await wait_for(reader.read(), 1)).endswith(b"ok")
+
+        for _, writer in clients:
+            writer.close()
+        await server.close(srv, connections)
+
+    def test_unlimited(self):
+        connections = Connections()
+        protocol = fakeProtocol()
+        connections.add(protocol)
+        assert protocol.transport.reading
+        connections.discard(protocol)
+        assert not connections
+
+
+class TestLoop:
+    def setUp(self):
+        self.default = get_event_loop()
+
+    def tearDown(self):
+        set_event_loop(self.default)
+
+    def test_default(self):
+        server = AioHTTPServer('127.0.0.1', 0, False, None)
+        assert server.event_loop() is get_event_loop()
+
+        loop = server.event_loop(fresh=True)
+        assert loop is not self.default
+        assert loop is get_event_loop()
+        loop.close()
+
+    def test_factory(self):
+        loops = []
+
+        def factory():
+            loops.append(new_event_loop())
+            return loops[-1]
+
+        server = AioHTTPServer('127.0.0.1', 0, False, None, loop=factory)
+        assert server.event_loop(fresh=True) is loops[0]
+        assert get_event_loop() is loops[0]
+        loops[0].close()
+
+    def test_instance(self):
+        loop = new_event_loop()
+        server = AioHTTPServer('127.0.0.1', 0, False, None, loop=loop)
+        assert server.event_loop() is loop
+
+        try:
+            AioHTTPServer('127.0.0.1', 0, False, None, workers=2, loop=loop)
+        except ValueError:
+            pass
+        else:
+            assert False
+        loop.close()
+
+    def test_embed(self):
+        loop = new_event_loop()
+        server = AioHTTPServer('127.0.0.1', 0, False, None, grace=0)
+
+        async def embed():
+            srv, connections = await server.start(None)
+            assert srv.sockets
+            await server.close(srv, connections)
+            return connections
+
+        assert not loop.run_until_complete(embed())
+        loop.close()
+
+
+async def response(reader):
+    head = (await wait_for(reader.readuntil(b"\r\n\r\n"), 5)).decode()
+    status, *lines = head.strip().split("\r\n")
+    headers = dict(line.split(": ", 1) for line in lines)
+    length = int(next(
+        value for name, value in headers.items()
+        if name.lower() == 'content-length'
+    ))
+    return status, headers, await reader.readexactly(length)
+
+
+class TestNative:
+    @aiotest
+    async def test_roundtrip(self):
+        server = AioHTTPServer('127.0.0.1', 0, False, None, native=True)
+
+        async def post(this, req, res):
+            return res.status(201).header("X-Id", await req.rest('id')) \
+                .push("created ").push(await req.form('name')).ok()
+
+        root = u('/').append([u('posts/'), u(':id')], ('POST',))(post)
+        srv, connections = await server.start(root)
+
+        reader, writer = await open_connection(
+            *srv.sockets[0].getsockname()[:2]
+        )
+        for i in range(2):
+            writer.write(
+                "POST /posts/{} HTTP/1.1\r\n"
+                "Content-Type: application/x-www-form-urlencoded\r\n"
+                "Content-Length: 8\r\n\r\n"
+                "name=foo".format(i).encode()
+            )
+            status, headers, body = await response(reader)
+            assert status == "HTTP/1.1 201 Created"
+            assert {
+                name.lower(): value for name, value in headers.items()
+            }['x-id'] == str(i)
+            assert body == b"created foo"
+        # kept alive for both requests.
+        assert len(connections) == 1
+
+        writer.close()
+        await aiosleep(0.05)
+        await server.close(srv, connections)
+
+    @aiotest
+    async def test_max_requests(self):
+        server = AioHTTPServer(
+            '127.0.0.1', 0, False, None, grace=0, native=True, max_requests=2
+        )
+        root = u('/').get(u('ping'))(
+            lambda this, req, res: res.push("ok").ok()
+        )
+        srv, connections = await server.start(root)
+
+        reader, writer = await open_connection(
+            *srv.sockets[0].getsockname()[:2]
+        )
+        writer.write(b"GET /ping HTTP/1.1\r\nHost: localhost\r\n\r\n" * 3)
+        # read to EOF, closed after the second response.
+        data = await wait_for(reader.read(), 5)
+        assert data.count(b"HTTP/1.1 200 OK") == 2
+
+        writer.close()
+        await server.close(srv, connections)
+
+    @aiotest
+    async def test_env(self):
+        server = AioHTTPServer('127.0.0.1', 0, False, None, native=True)
+        root = u('/').get(u('scheme'))(
+            lambda this, req, res: res.push(
+                "{} {}".format(req.env['wsgi.url_scheme'], req.path)
+            ).ok()
+        )
+        srv, connections = await server.start(root)
+
+        reader, writer = await open_connection(
+            *srv.sockets[0].getsockname()[:2]
+        )
+        writer.write(
+            b"GET /sch%65me HTTP/1.1\r\nConnection: close\r\n\r\n"
+        )
+        data = await wait_for(reader.read(), 5)
+        assert data.endswith(b"\r\n\r\nhttp /scheme")
+
+        writer.close()
+        await server.close(srv, connections)
+
+
+class TestStream:
+    def setUp(self):
+        self.produced = 0
+
+        async def chunks():
+            for _ in range(32):
+                self.produced += 1
+                yield b"x" * (1 << 20)
+
+        self.root = u('/').get(u('big'))(
+            lambda this, req, res: res.stream(chunks()).ok()
+        )
+
+    async def fetch(self, native):
+        server = AioHTTPServer(
+            '127.0.0.1', 0, False, None, grace=0, native=native
+        )
+        srv, connections = await server.start(self.root)
+        reader, writer = await open_connection(
+            *srv.sockets[0].getsockname()[:2]
+        )
+        writer.write(b"GET /big HTTP/1.1\r\nConnection: close\r\n\r\n")
+
+        # the client doesn't read, the producer waits for it.
+        await aiosleep(0.3)
+        assert 0 < self.produced < 32
+
+        data = await wait_for(reader.read(), 10)
+        assert self.produced == 32
+        assert data.count(b"x") == 32 << 20
+
+        writer.close()
+        await server.close(srv, connections)
+
+    @aiotest
+    async def test_wsgi(self):
+        await self.fetch(False)
+
+    @aiotest
+    async def test_native(self):
+        await self.fetch(True)
+
+
+class fakeServer(AioHTTPServer):
+    def serve(self, node, sock=None):
+        if node == 'crash':
+            raise RuntimeError(node)
+        open(os.path.join(node, str(os.getpid())), 'w').close()
+        sleep(60)
+
+
+def wait(path, count):
+    for _ in range(100):
+        pids = [int(name) for name in os.listdir(path)]
+        if len(pids) >= count:
+            return pids
+        sleep(0.05)
+    assert False, pids
+
+
+class TestPrefork:
+    def setUp(self):
+        self.path = mkdtemp()
+        self.server = fakeServer('127.0.0.1', 0, False, None, workers=2)
+        self.master = Process(target=self.server.prefork, args=(self.path,))
+
+    def tearDown(self):
+        if self.master.pid is not None and self.master.is_alive():
+            os.kill(self.master.pid, SIGKILL)
+        for name in os.listdir(self.path):
+            try:
+                os.kill(int(name), SIGKILL)
+            except ProcessLookupError:
+                pass
+        rmtree(self.path)
+
+    def test_respawn(self):
+        self.master.start()
+        first, second = wait(self.path, 2)
+        os.kill(first, SIGKILL)
+        third, = set(wait(self.path, 3)) - {first, second}
+
+        # SIGHUP starts new workers, then stops the old ones.
+        os.kill(self.master.pid, SIGHUP)
+        assert len(wait(self.path, 5)) == 5
+
+        os.kill(self.master.pid, SIGTERM)
+        self.master.join(5)
+        assert self.master.exitcode == 0
+
+    def test_work(self):
+        assert self.server.work('crash', None) == 1
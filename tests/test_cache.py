@@ -0,0 +1,158 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+from asyncio import sleep, gather
+
+from isperdal import Node as u
+from isperdal.cache import ResponseCache
+from isperdal.middleware import cookie  # noqa
+from isperdal.utils import aiotest
+
+
+def start_response(res_status, headers):
+    start_response.headers = dict(headers)
+
+
+def env(path, query="", **headers):
+    env = {'REQUEST_METHOD': "GET", 'PATH_INFO': path, 'QUERY_STRING': query}
+    env.update(('HTTP_' + k.upper(), v) for k, v in headers.items())
+    return env
+
+
+class TestCache:
+    def setUp(self):
+        self.calls = 0
+        self.cache = ResponseCache(query=('page',), headers=('Accept',))
+        self.root = u('/')
+
+        async def post(this, req, res):
+            self.calls += 1
+            await sleep(0.01)
+            return res.header("X-Post", "1").push("post ").push(
+                await req.rest('id')
+            ).ok()
+
+        def missing(this, req, res):
+            self.calls += 1
+            return res.status(404).err("Not Found")
+
+        def login(this, req, res):
+            self.calls += 1
+            return res.header("Set-Cookie", "session=1").push("hi").ok()
+
+        async def greet(this, req, res):
+            self.calls += 1
+            name = await req.query('name')
+            return res.cookie('user', name).push("hello " + name).ok()
+
+        def other(this, req, res):
+            self.calls += 1
+            return res.push("pushed").ok([b"other"])
+
+        self.root.then(u('posts/')).all()(self.cache)
+        self.root.append([u('posts/'), u(':id')])(post)
+        self.root.append([u('posts/'), u('none/'), u('x')])(missing)
+        self.root.append([u('posts/'), u('login/'), u('x')])(login)
+        self.root.append([u('posts/'), u('greet/'), u('x')])(greet)
+        self.root.append([u('posts/'), u('other/'), u('x')])(other)
+
+    @aiotest
+    async def test_hit(self):
+        for _ in range(3):
+            body = await self.root(
+                env('/posts/1', "page=2&x=1"), start_response
+            )
+            assert body == [b'post ', b'1']
+            assert start_response.headers['X-Post'] == "1"
+            assert start_response.headers['Content-Length'] == "6"
+        assert self.calls == 1
+
+        # unselected query params are not in key.
+        await self.root(env('/posts/1', "page=2&x=2"), start_response)
+        assert self.calls == 1
+
+        await self.root(env('/posts/1', "page=3"), start_response)
+        await self.root(
+            env('/posts/1', "page=2", accept="text/html"), start_response
+        )
+        await self.root(env('/posts/2', "page=2"), start_response)
+        assert self.calls == 4
+
+        for _ in range(2):
+            await self.root(env('/posts/none/x'), start_response)
+        assert self.calls == 6
+
+    @aiotest
+    async def test_private(self):
+        for headers in (
+            {'authorization': "Basic Zm9vOmJhcg=="},
+            {'cache_control': "max-age=0, no-store"}
+        ):
+            for _ in range(2):
+                await self.root(env('/posts/1', **headers), start_response)
+        assert self.calls == 4
+        assert not self.cache.entries
+
+        for _ in range(2):
+            await self.root(env('/posts/login/x'), start_response)
+            assert start_response.headers['Set-Cookie'] == "session=1"
+        assert self.calls == 6
+
+    @aiotest
+    async def test_cookie(self):
+        for name in ("user1", "user2"):
+            body = await self.root(
+                env('/posts/greet/x', "name=" + name), start_response
+            )
+            assert body == ["hello {}".format(name).encode()]
+            assert start_response.headers['Set-Cookie'] == "user=" + name
+        assert self.calls == 2
+        assert not self.cache.entries
+
+    @aiotest
+    async def test_result(self):
+        for _ in range(2):
+            body = await self.root(env('/posts/other/x'), start_response)
+            assert body == [b"other"]
+        assert self.calls == 2
+        assert not self.cache.entries
+
+    @aiotest
+    async def test_coalesce(self):
+        bodies = await gather(*(
+            self.root(env('/posts/1'), start_response) for _ in range(5)
+        ))
+        assert self.calls == 1
+        assert all(body == [b'post ', b'1'] for body in bodies)
+        assert not self.cache.pending
+
+    @aiotest
+    async def test_expire(self):
+        await self.root(env('/posts/1'), start_response)
+        for entry in self.cache.entries.items.values():
+            entry.expires = 0
+        await self.root(env('/posts/1'), start_response)
+        assert self.calls == 2
+
+    @aiotest
+    async def test_evict(self):
+        self.cache.entries.size = 100
+        for i in range(10):
+            await self.root(env('/posts/{}'.format(i)), start_response)
+        assert self.cache.entries.weight <= 100
+        assert self.cache.entries.evictions
+
+        await self.root(env('/posts/9'), start_response)
+        assert self.calls == 10
+
+    @aiotest
+    async def test_invalidate(self):
+        for path in ('/posts/1', '/posts/2', '/posts/3'):
+            await self.root(env(path), start_response)
+        assert self.cache.invalidate(path='/posts/1') == 1
+        assert self.cache.invalidate(prefix='/posts/') == 2
+
+        await self.root(env('/posts/2'), start_response)
+        assert self.calls == 4
+        assert self.cache.invalidate() == 1
+        assert not self.cache.entries.weight
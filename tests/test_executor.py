@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+from threading import get_ident
+from io import BytesIO
+import os
+
+from isperdal import Node as u
+from isperdal.executor import Pool, THREAD, PROCESS, registry
+from isperdal.utils import aiotest
+
+
+class StreamIO():
+    def __init__(self, buffer=b''):
+        self.buffer = BytesIO(buffer)
+
+    async def read(self, size=-1):
+        return self.buffer.read(size)
+
+
+def start_response(res_status, headers):
+    start_response.status = res_status
+
+
+def env(path, **extra):
+    return dict({'REQUEST_METHOD': "GET", 'PATH_INFO': path}, **extra)
+
+
+pool = Pool(THREAD, workers=2)
+worker = Pool(PROCESS, workers=1, body=True)
+
+
+@pool
+def echo(this, req, res):
+    return res.header("X-Thread", str(get_ident())).push("{} {} {}".format(
+        this, req.rest('id'), req.query('q')
+    )).ok()
+
+
+@pool
+def missing(this, req, res):
+    raise res.status(404).err("Missing")
+
+
+def factory(name):
+    return pool(lambda this, req, res: res.push(name).ok())
+
+
+@worker
+def pid(this, req, res):
+    return res.push("{} {} {}".format(
+        this, os.getpid(), req.body.decode()
+    )).ok()
+
+
+class TestExecutor:
+    def setUp(self):
+        self.root = u('/')
+        self.root.append([u('echo/'), u(':id')])(echo)
+        self.root.get(u('missing'))(missing)
+        self.root.post(u('pid'))(pid)
+        self.root.get(u('one'))(factory("one"))
+        self.root.get(u('two'))(factory("two"))
+
+    @aiotest
+    async def test_thread(self):
+        body = await self.root(
+            env('/echo/1', QUERY_STRING="q=foo"), start_response
+        )
+        assert body == [b':id 1 foo']
+        assert start_response.status == '200 OK'
+
+        body = await self.root(env('/missing'), start_response)
+        assert body == [b'404 Missing']
+        assert start_response.status == '404 Not Found'
+
+    @aiotest
+    async def test_factory(self):
+        for name in ("one", "two"):
+            body = await self.root(env('/' + name), start_response)
+            assert body == [name.encode()]
+
+    def test_unique(self):
+        def other(this, req, res):
+            pass
+        other.__qualname__ = 'pid'
+
+        assert registry[(__name__, 'pid')] is pid.__wrapped__
+        worker(pid.__wrapped__)
+        for handle in (other, lambda this, req, res: None):
+            try:
+                worker(handle)
+            except ValueError:
+                pass
+            else:
+                assert False
+
+    @aiotest
+    async def test_busy(self):
+        pool.configure(queue=0)
+        try:
+            body = await self.root(env('/echo/1'), start_response)
+            assert body == [b'503 Service Unavailable']
+            assert start_response.status.startswith('503')
+        finally:
+            pool.configure(queue=64)
+
+    @aiotest
+    async def test_process(self):
+        try:
+            body = await self.root(dict(
+                env('/pid', REQUEST_METHOD="POST"),
+                **{'wsgi.input': StreamIO(b"data")}
+            ), start_response)
+            this, child, data = b"".join(body).decode().split()
+            assert this == 'pid' and data == 'data'
+            assert int(child) != os.getpid()
+        finally:
+            worker.shutdown()
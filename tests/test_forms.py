@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+from isperdal.utils import aiotest
+from isperdal.forms import (
+    MultipartParser, MultipartReader, FormError, PartTooLarge, Field,
+    parse_multipart, parse_urlencoded, DATA, PART, PART_END, END
+)
+
+
+body = (
+    b'--xx\r\n'
+    b'Content-Disposition: form-data; name="file"; filename="a.txt"\r\n'
+    b'Content-Type: text/plain\r\n\r\n'
+    b'--x\r\n--x-\r\n'
+    b'--xx\r\n'
+    b'Content-Disposition: form-data; name="foo"\r\n\r\none\r\n'
+    b'--xx\r\n'
+    b'Content-Disposition: form-data; name="foo"\r\n\r\ntwo\r\n'
+    b'--xx--\r\n'
+)
+
+
+def reader(data, size):
+    chunks = [data[i:i + size] for i in range(0, len(data), size)]
+
+    async def read(*_):
+        return chunks.pop(0) if chunks else b""
+    return read
+
+
+class TestMultipartParser:
+    def test_feed(self):
+        for size in (1, 2, 5, len(body)):
+            parser = MultipartParser(b"xx")
+            events = []
+            for i in range(0, len(body), size):
+                events.extend(parser.feed(body[i:i + size]))
+
+            assert parser.done
+            assert [e for e, _ in events if e != DATA] == [
+                PART, PART_END, PART, PART_END, PART, PART_END, END
+            ]
+            assert events[0][1]['content-type'] == 'text/plain'
+            data = b"".join(d for e, d in events if e == DATA)
+            assert data == b'--x\r\n--x-onetwo'
+
+    def test_malformed(self):
+        parser = MultipartParser(b"xx")
+        try:
+            parser.feed(b'--xx!!')
+        except FormError:
+            pass
+        else:
+            assert False
+
+
+class TestForms:
+    def test_field(self):
+        field = Field('foo', "one")
+        field.headers['X-Foo'] = "foo"
+        assert Field('bar').headers == {}
+
+    @aiotest
+    async def test_multipart(self):
+        form = await parse_multipart(reader(body, 3), b"xx", spool=2)
+        assert form.keys() == ['file', 'foo']
+        assert form.getvalue('foo') == ['one', 'two']
+        assert form.getfirst('file') == b'--x\r\n--x-'
+        assert form['file'].filename == 'a.txt'
+        assert form.getfile('file').read() == b'--x\r\n--x-'
+
+    @aiotest
+    async def test_reader(self):
+        parts = MultipartReader(reader(body, 4), b"xx")
+        part = await parts.next()
+        assert part.name == 'file'
+        assert (await part.read())
+
+        # the rest of the part is skipped.
+        part = await parts.next()
+        assert part.name == 'foo'
+        assert (await part.read()) == b'one'
+        assert (await part.read()) == b''
+
+        assert (await parts.next()).name == 'foo'
+        assert (await parts.next()) is None
+
+    @aiotest
+    async def test_limit(self):
+        try:
+            await parse_multipart(reader(body, 3), b"xx", max_part=4)
+        except PartTooLarge as err:
+            assert err.status == 413
+        else:
+            assert False
+
+        try:
+            await parse_multipart(reader(body[:40], 3), b"xx")
+        except FormError as err:
+            assert err.status == 400
+        else:
+            assert False
+
+    @aiotest
+    async def test_urlencoded(self):
+        form = await parse_urlencoded(
+            reader(b"foo=one&foo=two&bar=%E4%B8%AD", 4)
+        )
+        assert form.getvalue('foo') == ['one', 'two']
+        assert form.getfirst('bar') == '中'
+
+        try:
+            await parse_urlencoded(reader(b"foo=" + b"x" * 10, 4), 8)
+        except PartTooLarge:
+            pass
+        else:
+            assert False
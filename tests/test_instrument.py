@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+from socket import socket, AF_INET, SOCK_DGRAM
+
+from isperdal import Node as u
+from isperdal.request import Request
+from isperdal.response import Response
+from isperdal.instrument import (
+    Histogram, StatsdSink, Tee, ROUTE, HANDLE, TRIGGER, HOOK
+)
+from isperdal.utils import aiotest
+
+
+def start_response(res_status, headers):
+    pass
+
+
+def env(path):
+    return {'REQUEST_METHOD': "GET", 'PATH_INFO': path}
+
+
+def before(this, req, res):
+    res.hook(after)
+
+
+def after(res):
+    pass
+
+
+async def show(this, req, res):
+    return res.push((await req.rest('id'))).ok()
+
+
+class TestInstrument:
+    def setUp(self):
+        self.hist = Histogram()
+        u.instrument(self.hist)
+        self.root = u('/').all()(before)
+        self.root.append([u('posts/'), u(':id')])(show)
+
+    def tearDown(self):
+        u.instrument(None)
+
+    @aiotest
+    async def test_timing(self):
+        body = await self.root(env('/posts/1'), start_response)
+        assert body == [b'1']
+
+        assert self.hist.count(ROUTE, '/posts/:id') == 1
+        assert self.hist.count(HANDLE, '/ before') == 1
+        assert self.hist.count(HANDLE, '/posts/:id show') == 1
+        assert self.hist.count(HOOK, 'after') == 1
+        assert not self.hist.count(TRIGGER, 404)
+
+        await self.root(env('/none'), start_response)
+        assert self.hist.count(TRIGGER, 404) == 1
+        assert self.hist.count(ROUTE, '/') == 1
+
+    @aiotest
+    async def test_disabled(self):
+        u.instrument(None)
+        await self.root(env('/posts/1'), start_response)
+        assert not self.hist.keys()
+
+    @aiotest
+    async def test_statsd(self):
+        listener = socket(AF_INET, SOCK_DGRAM)
+        listener.bind(('127.0.0.1', 0))
+        listener.settimeout(1)
+        sink = StatsdSink(*listener.getsockname(), prefix="app")
+        u.instrument(Tee(self.hist, sink))
+
+        try:
+            req, res = Request(env('/posts/1')), Response(start_response)
+            await self.root.serve(req, res)
+
+            metrics = set()
+            for _ in range(4):
+                name, _, value = listener.recv(512).decode().partition(':')
+                assert value.endswith('|ms')
+                float(value[:-3])
+                metrics.add(name)
+
+            assert metrics == {
+                'app.route.posts_id',
+                'app.handle.before',
+                'app.handle.posts_id_show',
+                'app.hook.after'
+            }
+            assert len(self.hist.keys()) == 4
+        finally:
+            sink.close()
+            listener.close()
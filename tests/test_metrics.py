@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+from asyncio import sleep
+from multiprocessing import Process
+from tempfile import mkdtemp
+from shutil import rmtree
+from glob import glob
+import os
+
+from isperdal import Node as u
+from isperdal.metrics import Metrics, load
+from isperdal.utils import aiotest
+
+
+def start_response(res_status, headers):
+    pass
+
+
+def env(path):
+    return {'REQUEST_METHOD': "GET", 'PATH_INFO': path}
+
+
+def app(metrics):
+    root = u('/').append([u('posts/'), u(':id')])(
+        lambda this, req, res: res.push("post").ok()
+    )
+    root.add(metrics.node())
+    return root
+
+
+def worker(path):
+    metrics = Metrics(path)
+    metrics.begin()
+    metrics.end('/posts/:id', 200, 0.02)
+    metrics.begin()
+    metrics.flush()
+
+
+class TestMetrics:
+    def setUp(self):
+        self.metrics = Metrics()
+        u.metrics = self.metrics
+        self.root = app(self.metrics)
+
+    def tearDown(self):
+        u.metrics = None
+
+    @aiotest
+    async def test_expose(self):
+        for path in ('/posts/1', '/posts/2', '/none'):
+            await self.root(env(path), start_response)
+        assert self.metrics.inflight == 0
+
+        text = b"".join(
+            await self.root(env('/metrics'), start_response)
+        ).decode()
+        assert (
+            'isperdal_requests_total{route="/posts/:id",status="200"} 2'
+        ) in text
+        assert 'isperdal_requests_total{route="/",status="404"} 1' in text
+        assert 'isperdal_triggers_total{code="404"} 1' in text
+        assert 'isperdal_requests_in_flight 1' in text
+        assert (
+            'isperdal_request_duration_seconds_bucket'
+            '{route="/posts/:id",le="+Inf"} 2'
+        ) in text
+        assert (
+            'isperdal_request_duration_seconds_count{route="/posts/:id"} 2'
+        ) in text
+
+    @aiotest
+    async def test_workers(self):
+        path = mkdtemp()
+        try:
+            metrics = Metrics(path)
+            root = app(metrics)
+            u.metrics = metrics
+            await root(env('/posts/1'), start_response)
+
+            child = Process(target=worker, args=(path,))
+            child.start()
+            child.join()
+            name, = glob(os.path.join(path, "{}-*.metrics".format(
+                child.pid
+            )))
+            assert load(name)['inflight'] == 1
+
+            for _ in range(2):
+                text = metrics.expose()
+                assert (
+                    'isperdal_requests_total'
+                    '{route="/posts/:id",status="200"} 2'
+                ) in text
+                # in-flight of the exited worker is dropped.
+                assert 'isperdal_requests_in_flight 0' in text
+                assert (
+                    'isperdal_request_duration_seconds_bucket'
+                    '{route="/posts/:id",le="0.025"} 2'
+                ) in text
+                # folded into the retained total, once.
+                assert not os.path.exists(name)
+                assert os.path.exists(os.path.join(path, "retained.json"))
+        finally:
+            rmtree(path)
+
+    @aiotest
+    async def test_idle(self):
+        path = mkdtemp()
+        try:
+            metrics = Metrics(path, interval=0.05)
+            for _ in range(2):
+                metrics.begin()
+                metrics.end('/posts/:id', 200, 0.01)
+
+            name, = glob(os.path.join(path, "*.metrics"))
+            assert load(name)['requests'] == [['/posts/:id', 200, 1]]
+            # the tail is flushed after `interval`, without more requests.
+            await sleep(0.1)
+            assert load(name)['requests'] == [['/posts/:id', 200, 2]]
+        finally:
+            rmtree(path)
@@ -0,0 +1,49 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+from asyncio import sleep
+from time import sleep as block_sleep
+
+from isperdal import Node as u
+from isperdal.monitor import Monitor
+from isperdal.instrument import Histogram, LAG, SLOW
+from isperdal.utils import aiotest
+
+
+def start_response(res_status, headers):
+    pass
+
+
+def block(this, req, res):
+    block_sleep(0.15)
+    return res.push("done").ok()
+
+
+class TestMonitor:
+    def setUp(self):
+        self.hist = Histogram()
+        self.monitor = Monitor(threshold=0.05, interval=0.01, sink=self.hist)
+        self.root = u('/').append([u('block/'), u(':id')])(block)
+
+    def tearDown(self):
+        self.monitor.stop()
+
+    @aiotest
+    async def test_lag(self):
+        self.monitor.start()
+        await sleep(0.05)
+        assert self.hist.count(LAG, "loop")
+        assert not self.monitor.blocks
+
+        await self.root(
+            {'REQUEST_METHOD': "GET", 'PATH_INFO': "/block/1"},
+            start_response
+        )
+        await sleep(0.05)
+        self.monitor.stop()
+
+        route, handle, lag, stack = self.monitor.blocks[0]
+        assert (route, handle) == ("GET /block/:id", "block")
+        assert lag > 0.05
+        assert "block_sleep(0.15)" in stack
+        assert self.hist.count(SLOW, "GET /block/:id block") == 1
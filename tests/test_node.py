@@ -4,6 +4,7 @@
 from copy import copy
 
 from isperdal import Node as u
+from isperdal.node import SYNC, ASYNC, SOCKET
 from isperdal.request import Request
 from isperdal.response import Response
 from isperdal.websocket import WebSocket
@@ -25,12 +26,12 @@ class TestNode:
         self.root = u('/')
 
     @aiotest
-    def test_route(self):
+    async def test_route(self):
         index = u('index')
         self.root.route(index)(lambda: 1)
         assert not self.root.subnode[-1].handles['OPTION']
         assert self.root.subnode[-1].handles['HEAD']
-        assert (yield from self.root.subnode.pop().handles['GET'].pop()()) is 1
+        assert self.root.subnode.pop().handles['GET'].pop()() is 1
 
         self.root.route(index)(WebSocket)
         assert not self.root.subnode[-1].handles['OPTION']
@@ -44,55 +45,55 @@ class TestNode:
             index, methods=('OPTION',)
         )(lambda: 1)
         assert (
-            yield from self.root.subnode.pop().handles['OPTION'].pop()()
+            self.root.subnode.pop().handles['OPTION'].pop()()
         ) is 1
 
     @aiotest
-    def test_all(self):
+    async def test_all(self):
         self.root.all()(lambda: 1)
         assert self.root.handles['OPTION']
         assert self.root.handles['GET']
 
         for h in self.root.handles.keys():
-            assert (yield from self.root.handles[h].pop()()) is 1
+            assert self.root.handles[h].pop()() is 1
 
         self.root.all(('GET',))(lambda: 1)
         assert not self.root.handles['OPTION']
-        assert (yield from self.root.handles['GET'].pop()()) is 1
+        assert self.root.handles['GET'].pop()() is 1
 
         self.root.all()((lambda: 1), (lambda: 2))
-        assert (yield from self.root.handles['GET'].pop()()) is 2
-        assert (yield from self.root.handles['GET'].pop()()) is 1
+        assert self.root.handles['GET'].pop()() is 2
+        assert self.root.handles['GET'].pop()() is 1
 
     @aiotest
-    def test_add(self):
+    async def test_add(self):
         index = u('index/').all()(lambda: 1)
         self.root.add(index)
-        assert (yield from self.root.subnode[0].handles['GET'].pop()()) is 1
+        assert self.root.subnode[0].handles['GET'].pop()() is 1
         index2 = u('index/').get(u('app'))(lambda: 2)
         self.root.add(index2)
         assert (
-            yield from self.root
+            self.root
             .subnode.pop()
             .subnode.pop()
             .handles['GET'].pop()()
         ) is 2
 
     @aiotest
-    def test_then(self):
+    async def test_then(self):
         self.root.then(u('index/')).then(u('test')).all()(lambda: 1)
         assert (
-            yield from self.root
+            self.root
             .subnode.pop()
             .subnode.pop()
             .handles['GET'].pop()()
         ) is 1
 
     @aiotest
-    def test_append(self):
+    async def test_append(self):
         self.root.append([u('index/'), u('test')])(lambda: 1)
         assert (
-            yield from self.root
+            self.root
             .subnode.pop()
             .subnode.pop()
             .handles['GET'].pop()()
@@ -101,65 +102,93 @@ class TestNode:
         self.root.append([u('index/'), u('test')], methods=('GET',))(lambda: 1)
         assert not self.root.subnode[-1].subnode[-1].handles['OPTION']
         assert (
-            yield from self.root
+            self.root
             .subnode.pop()
             .subnode.pop()
             .handles['GET'].pop()()
         ) is 1
 
     @aiotest
-    def test_get(self):
+    async def test_get(self):
         self.root.get(u('index/'))(lambda: 1)
         assert not self.root.subnode[-1].handles['OPTION']
         assert not self.root.subnode[-1].handles['HEAD']
-        assert (yield from self.root.subnode.pop().handles['GET'].pop()()) is 1
+        assert self.root.subnode.pop().handles['GET'].pop()() is 1
 
     @aiotest
-    def test_err(self):
+    async def test_chain(self):
+        async def native(this, req, res):
+            return res.push("2")
+
+        # old style, without `@coroutine`.
+        def generator(this, req, res):
+            return (yield from native(this, req, res))
+
+        self.root.all()(
+            lambda this, req, res: res.push("1") and None,
+            native, generator, WebSocket,
+            lambda this, req, res: native(this, req, res)
+        )
+        assert [kind for kind, _ in self.root.chain('GET')] == [
+            SYNC, ASYNC, ASYNC, SOCKET, SYNC
+        ]
+        assert self.root.chain('FOO') is None
+
+        chain = self.root.chain('GET')
+        self.root.all()(lambda this, req, res: res.ok())
+        assert self.root.chain('GET') is not chain
+
+        req, res = Request(env), Response(start_response)
+        assert req.branches.pop() == '/'
+        result = self.root.handler(req, res, copy(req.branches))
+        assert (await unok(result)) == [b'1', b'2', b'2', b'2']
+
+    @aiotest
+    async def test_err(self):
         self.root.err(200)(lambda: 1)
-        assert (yield from self.root.codes.pop(200)()) is 1
+        assert (await self.root.codes.pop(200)()) is 1
 
     @aiotest
-    def test_handler(self):
+    async def test_handler(self):
         # '/'
         req, res = Request(env), Response(start_response)
-        assert req.branches.pop(0) == '/'
+        assert req.branches.pop() == '/'
 
         result = u('/').all()(
             lambda this, req, res:
                 res.push("Test.").ok()
         ).handler(req, res, copy(req.branches))
 
-        assert (yield from unok(result)) == [b'Test.']
+        assert (await unok(result)) == [b'Test.']
 
         # '/posts/q'
         env['PATH_INFO'] = '/posts/1'
         req, res = Request(env), Response(start_response)
-        assert req.branches.pop(0) == '/'
+        assert req.branches.pop() == '/'
 
         result = u('/').append([u('posts/'), u(':id')])(
             lambda this, req, res:
                 res.push((yield from req.rest('id'))).ok()
         ).handler(req, res, copy(req.branches))
 
-        assert (yield from unok(result)) == [b'1']
+        assert (await unok(result)) == [b'1']
 
         # '/file/img/test.png'
         env['PATH_INFO'] = '/file/img/test.png'
         req, res = Request(env), Response(start_response)
-        assert req.branches.pop(0) == '/'
+        assert req.branches.pop() == '/'
 
         result = u('/').append([u('file/'), u('img/'), u(':!png')])(
             lambda this, req, res:
                 res.push((yield from req.rest('png'))).ok()
         ).handler(req, res, copy(req.branches))
 
-        assert (yield from unok(result)) == [b'test.png']
+        assert (await unok(result)) == [b'test.png']
 
         # '/error'
         env['PATH_INFO'] = '/error'
         req, res = Request(env), Response(start_response)
-        assert req.branches.pop(0) == '/'
+        assert req.branches.pop() == '/'
 
         result = u('/').err(500)(
             lambda this, req, res, err:
@@ -169,7 +198,66 @@ class TestNode:
                 res.status(500).err("Test")
         ).handler(req, res, copy(req.branches))
 
-        assert (yield from unok(result)) == [b'Test']
+        assert (await unok(result)) == [b'Test']
+
+    @aiotest
+    async def test_compile(self):
+        root = u('/')
+        root.append([u('posts/'), u(':id')])(
+            lambda this, req, res:
+                res.push((yield from req.rest('id'))).ok()
+        )
+        root.append([u('posts/'), u('new')])(
+            lambda this, req, res:
+                res.push("NEW").ok()
+        )
+        root.append([u('file/'), u(':!path')])(
+            lambda this, req, res:
+                res.push((yield from req.rest('path'))).ok()
+        )
+        assert root.compile() is root
+
+        static, fallback = root.subnode[0].compiled
+        assert static['new'] == (':id', 'new')
+        assert fallback[False] == (':id',)
+        assert fallback[True] == ()
+
+        for path, body in (
+            ('/posts/1', [b'1']),
+            ('/posts/new', [b'new']),
+            ('/file/img/test.png', [b'img/test.png'])
+        ):
+            env['PATH_INFO'] = path
+            req, res = Request(env), Response(start_response)
+            assert req.branches.pop() == '/'
+            result = root.handler(req, res, copy(req.branches))
+            assert (await unok(result)) == body
+
+        root.add(u('index'))
+        assert root.compiled is None
+
+    @aiotest
+    async def test_memoize(self):
+        root = u('/').memoize(2)
+        root.append([u('posts/'), u(':id')])(
+            lambda this, req, res:
+                res.push((yield from req.rest('id'))).ok()
+        )
+
+        for path, body in (
+            ('/posts/1', [b'1']),
+            ('/posts/1', [b'1']),
+            ('/posts/2', [b'2'])
+        ):
+            env['PATH_INFO'] = path
+            req, res = Request(env), Response(start_response)
+            assert req.branches.pop() == '/'
+            assert (await unok(root.start(req, res))) == body
+
+        assert (root.lru.hits, root.lru.misses) == (1, 2)
+
+        root.then(u('posts/')).add(u('new'))
+        assert not root.lru
 
     def test_copy(self):
         node = u("node")
@@ -184,6 +272,26 @@ class TestNode:
         assert node_copy.handles == node.handles
         assert node_copy.codes == node.codes
 
+    @aiotest
+    async def test_copy_reset(self):
+        root = u('/')
+        posts = u('posts')
+        root.add(posts.all()(lambda this, req, res: res.push("posts").ok()))
+        u('/').add(posts.copy('posts/')).compile()
+        copied = posts.family[-1]
+        assert copied.chain('GET') and copied.compiled is not None
+
+        posts.add(u('new').all()(lambda this, req, res: res.push("new").ok()))
+        posts.all()(lambda this, req, res: None)
+        assert copied.compiled is None and copied.chains is None
+        assert len(copied.chain('GET')) == 2
+
+        for node in (posts, copied):
+            req, res = Request({'PATH_INFO': "/new"}), Response(start_response)
+            req.branches.pop()
+            route = node.resolve(copy(req.branches))
+            assert [n for n, _, _ in route] == ['new']
+
     def test_div(self):
         nodes = u("/") / u("name")
         nodes2 = u("/") / u("name") / u("id")
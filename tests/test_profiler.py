@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+from time import perf_counter, sleep
+from signal import SIGUSR2, SIG_DFL, signal
+import os
+
+from isperdal import Node as u
+from isperdal.profiler import Profiler
+from isperdal.utils import aiotest
+
+
+def start_response(res_status, headers):
+    pass
+
+
+def env(path, method="GET"):
+    return {'REQUEST_METHOD': method, 'PATH_INFO': path}
+
+
+def busy(this, req, res):
+    deadline = perf_counter() + 0.1
+    while perf_counter() < deadline:
+        pass
+    return res.push("done").ok()
+
+
+class TestProfiler:
+    def setUp(self):
+        self.profiler = Profiler(interval=0.001)
+        self.root = u('/').append([u('busy/'), u(':id')])(busy)
+        self.root.add(self.profiler.node())
+
+    def tearDown(self):
+        self.profiler.stop()
+
+    @aiotest
+    async def test_sample(self):
+        self.profiler.start()
+        await self.root(env('/busy/1'), start_response)
+        self.profiler.stop()
+
+        lines = self.profiler.collapsed().splitlines()
+        assert lines
+        tagged = [
+            line for line in lines if line.startswith("GET /busy/:id;busy;")
+        ]
+        assert tagged
+        stack, _, count = tagged[0].rpartition(" ")
+        assert int(count) > 0
+        assert stack.endswith("busy (test_profiler.py:{})".format(
+            busy.__code__.co_firstlineno
+        ))
+
+        self.profiler.clear()
+        assert not self.profiler.collapsed()
+
+    @aiotest
+    async def test_node(self):
+        body = await self.root(env('/profile', "POST"), start_response)
+        assert body == [b'on'] and self.profiler.running
+
+        await self.root(env('/busy/2'), start_response)
+        body = await self.root(env('/profile', "POST"), start_response)
+        assert body == [b'off'] and not self.profiler.running
+
+        body = await self.root(env('/profile'), start_response)
+        assert b"GET /busy/:id;busy;" in b"".join(body)
+
+        await self.root(env('/profile', "DELETE"), start_response)
+        assert not self.profiler.samples
+
+    def test_signal(self):
+        self.profiler.install()
+        try:
+            os.kill(os.getpid(), SIGUSR2)
+            sleep(0.01)
+            assert self.profiler.running
+            os.kill(os.getpid(), SIGUSR2)
+            sleep(0.01)
+            assert not self.profiler.running
+        finally:
+            signal(SIGUSR2, SIG_DFL)
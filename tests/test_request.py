@@ -2,19 +2,20 @@
 # encoding: utf-8
 
 from io import BytesIO
-import asyncio
+
+from aiohttp.multidict import CIMultiDict
 
 from isperdal.utils import aiotest
-from isperdal.request import Request
+from isperdal.request import Request, TooLarge
+from isperdal import request
 
 
 class fakeStreamIO():
     def __init__(self, buffer=b''):
         self.buffer = BytesIO(buffer)
 
-    @asyncio.coroutine
-    def read(self):
-        return self.buffer.read()
+    async def read(self, size=-1):
+        return self.buffer.read(size)
 
 
 env = {
@@ -28,64 +29,156 @@ env = {
 }
 
 
+class fakeMessage():
+    method = "post"
+    path = "/foo/bar?baz=qux"
+    headers = CIMultiDict([
+        ('USER-AGENT', "Mozilla"),
+        ('CONTENT-TYPE', "application/x-www-form-urlencoded"),
+        ('Accept', "text/html"),
+        ('Accept', "*/*")
+    ])
+
+
 class TestReq:
     @aiotest
-    def test_body(self):
+    async def test_from_message(self):
+        req = Request.from_message(
+            fakeMessage(), fakeStreamIO(b"bar=baz"), {}
+        )
+        assert req.method == "POST"
+        assert req.uri == "/foo/bar?baz=qux"
+        assert req.path == "/foo/bar"
+        assert list(req.branches) == ['/', 'foo/', 'bar']
+        assert (await req.query('baz')) == 'qux'
+        assert (await req.header('User-Agent')) == 'Mozilla'
+        assert (await req.header('Accept')) == 'text/html'
+        assert req.headers.getall('accept') == ['text/html', '*/*']
+        assert (await req.form('bar')) == 'baz'
+
+        message = fakeMessage()
+        message.path = "/foo/%E6%B5%8B%20b+r?baz=q%20x"
+        req = Request.from_message(message, fakeStreamIO(), {})
+        assert req.uri == message.path
+        assert req.path == "/foo/测 b+r"
+        assert list(req.branches) == ['/', 'foo/', '测 b+r']
+        assert (await req.query('baz')) == 'q x'
+
+    @aiotest
+    async def test_body(self):
         req = Request(env)
-        assert (yield from req.body).tell() is 0
-        assert isinstance((yield from req.body).read(), bytes)
+        assert (await req.body).tell() is 0
+        assert isinstance((await req.body).read(), bytes)
+
+        req = Request(dict(env, **{
+            'wsgi.input': fakeStreamIO(b"bar=baz")
+        }))
+        assert (await req.body).tell() is 0
+        assert (await req.body).read() == b'bar=baz'
+        assert (await req.env['wsgi.input'].read()) == b''
+        assert (await req.body).tell() is 0
+
+    @aiotest
+    async def test_read(self):
+        req = Request(dict(env, **{
+            'CONTENT_LENGTH': "7",
+            'wsgi.input': fakeStreamIO(b"bar=baz")
+        }))
+        assert req.length == 7
+        assert (await req.read(4)) == b'bar='
+        assert (await req.read(4)) == b'baz'
+        assert (await req.read(4)) == b''
 
         req = Request(dict(env, **{
             'wsgi.input': fakeStreamIO(b"bar=baz")
         }))
-        assert (yield from req.body).tell() is 0
-        assert (yield from req.body).read() == b'bar=baz'
-        assert (yield from req.env['wsgi.input'].read()) == b''
-        assert (yield from req.body).tell() is 0
+        Request.max_body = 4
+        try:
+            assert (await req.read(4)) == b'bar='
+            await req.read(4)
+        except TooLarge as err:
+            assert err.err()
+        else:
+            assert False
+        finally:
+            Request.max_body = None
 
     @aiotest
-    def test_rest(self):
+    async def test_rest(self):
         req = Request(env)
-        assert (yield from req.rest('foo')) is None
+        assert (await req.rest('foo')) is None
 
         req._rest['foo'] = 'oof'
-        assert (yield from req.rest('foo')) == 'oof'
+        assert (await req.rest('foo')) == 'oof'
 
         req._rest['中文'] = r'%E6%B5%8B%E8%AF%95'
-        assert (yield from req.rest('中文')) == '测试'
+        assert (await req.rest('中文')) == '测试'
+        assert (await req.rest('中文')) == '测试'
+
+        req._rest['中文'] = 'a+b'
+        assert (await req.rest('中文')) == 'a b'
 
     @aiotest
-    def test_querys(self):
+    async def test_querys(self):
         req = Request(env)
-        assert dict((yield from req.querys)) == {}
+        assert dict((await req.querys)) == {}
 
         req = Request(dict(env, **{
             'QUERY_STRING': "foo=one&foo=two&foo[foo]=three"
         }))
-        assert (yield from req.querys).get('foo') == ['one', 'two']
-        assert (yield from req.querys).get('foo[foo]') == ['three']
+        assert (await req.querys).get('foo') == ['one', 'two']
+        assert (await req.querys).get('foo[foo]') == ['three']
 
     @aiotest
-    def test_query(self):
+    async def test_query(self):
         req = Request(env)
-        assert (yield from req.query('foo')) is None
+        assert (await req.query('foo')) is None
 
         req = Request(dict(env, **{
             'QUERY_STRING': "foo=one&foo=two&foo[foo]=three"
         }))
-        assert (yield from req.query('foo')) == 'one'
-        assert (yield from req.query('foo[foo]')) == 'three'
+        assert (await req.query('foo')) == 'one'
+        assert (await req.query('foo[foo]')) == 'three'
+
+    @aiotest
+    async def test_lazy(self):
+        calls = []
+        parse_qs = request.parse_qs
+        request.parse_qs = lambda *args, **kwargs: (
+            calls.append(args) or parse_qs(*args, **kwargs)
+        )
+        try:
+            req = Request(dict(env, **{
+                'QUERY_STRING': "foo=one"
+            }))
+            assert (await req.parm('foo')) == 'one'
+            assert (await req.parm('bar')) is None
+            assert (await req.query('foo')) == 'one'
+        finally:
+            request.parse_qs = parse_qs
+
+        assert len(calls) == 1
+        assert (await req.forms) is (await req.forms)
 
     @aiotest
-    def test_header(self):
+    async def test_header(self):
         req = Request(env)
-        assert (yield from req.header('User-Agent')) == 'Mozilla'
-        assert (yield from req.header('Remote-Addr')) == None
+        assert (await req.header('User-Agent')) == 'Mozilla'
+        assert (await req.header('Remote-Addr')) == None
+        assert (await req.header('user_agent')) == 'Mozilla'
+
+        req = Request(dict(env, **{
+            'HTTP_COOKIE': "a=1; b=2",
+            'isperdal.headers': CIMultiDict([
+                ('Cookie', "a=1"), ('Cookie', "b=2")
+            ])
+        }))
+        assert req.headers.getall('Cookie') == ['a=1', 'b=2']
 
     @aiotest
-    def test_forms(self):
+    async def test_forms(self):
         req = Request(env)
-        assert dict((yield from req.forms)) == {}
+        assert dict((await req.forms)) == {}
 
         req = Request(dict(env, **{
             'REQUEST_METHOD': "POST",
@@ -93,8 +186,8 @@ class TestReq:
             'CONTENT_LENGTH': "30",
             'wsgi.input': fakeStreamIO(b"foo=one&foo=two&foo[foo]=three")
         }))
-        assert (yield from req.forms).getvalue('foo') == ['one', 'two']
-        assert (yield from req.forms).getvalue('foo[foo]') == 'three'
+        assert (await req.forms).getvalue('foo') == ['one', 'two']
+        assert (await req.forms).getvalue('foo[foo]') == 'three'
 
         req = Request(dict(env, **{
             'REQUEST_METHOD': "POST",
@@ -115,13 +208,32 @@ class TestReq:
                 b'------WebKitFormBoundaryhvj9Daa5OwrBBWG9--\r\n'
             )
         }))
-        assert (yield from req.forms).getvalue('bar') == 'baz'
-        assert (yield from req.forms).getvalue('foo') == b'Hi\n'
+        assert (await req.forms).getvalue('bar') == 'baz'
+        assert (await req.forms).getvalue('foo') == b'Hi\n'
+
+    @aiotest
+    async def test_parts(self):
+        req = Request(dict(env, **{
+            'REQUEST_METHOD': "POST",
+            'CONTENT_TYPE': "multipart/form-data; boundary=xx",
+            'wsgi.input': fakeStreamIO(
+                b'--xx\r\n'
+                b'Content-Disposition: '
+                b'form-data; name="foo"; filename="test.txt"\r\n\r\n'
+                b'Hi\n\r\n'
+                b'--xx--\r\n'
+            )
+        }))
+        parts = await req.parts()
+        part = await parts.next()
+        assert part.filename == 'test.txt'
+        assert (await part.read()) == b'Hi\n'
+        assert (await parts.next()) is None
 
     @aiotest
-    def test_form(self):
+    async def test_form(self):
         req = Request(env)
-        assert (yield from req.form('foo')) is None
+        assert (await req.form('foo')) is None
 
         req = Request(dict(env, **{
             'REQUEST_METHOD': "POST",
@@ -129,8 +241,8 @@ class TestReq:
             'CONTENT_LENGTH': "30",
             'wsgi.input': fakeStreamIO(b"foo=one&foo=two&foo[foo]=three")
         }))
-        assert (yield from req.form('foo')) == 'one'
-        assert (yield from req.form('foo[foo]')) == 'three'
+        assert (await req.form('foo')) == 'one'
+        assert (await req.form('foo[foo]')) == 'three'
 
         req = Request(dict(env, **{
             'REQUEST_METHOD': "POST",
@@ -151,5 +263,5 @@ class TestReq:
                 b'------WebKitFormBoundaryhvj9Daa5OwrBBWG9--\r\n'
             )
         }))
-        assert (yield from req.form('bar')) == 'baz'
-        assert (yield from req.form('foo')) == b'Hi\n'
+        assert (await req.form('bar')) == 'baz'
+        assert (await req.form('foo')) == b'Hi\n'
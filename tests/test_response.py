@@ -2,18 +2,16 @@
 # encoding: utf-8
 
 from io import BytesIO
-import asyncio
 
-from isperdal.response import Response
-from isperdal.utils import Result, Err
+from isperdal.response import Response, Stream
+from isperdal.utils import Result, Err, aiotest
 
 
 class fakeStreamIO():
     def __init__(self, buffer=b''):
         self.buffer = BytesIO(buffer)
 
-    @asyncio.coroutine
-    def read(self):
+    async def read(self):
         return self.buffer.read()
 
 
@@ -58,9 +56,47 @@ class TestRes:
         assert self.res.push('push') is self.res
         assert self.res.body[-1] == b'push'
 
-        assert self.res.push('p'*8193) is self.res
-        assert self.res.body[-2] == b'p'*8192
-        assert self.res.body[-1] == b'p'
+        assert self.res.push(b'p'*8193) is self.res
+        assert self.res.body[-1] == b'p'*8193
+        assert self.res.length == 8197
+
+        # fails at push, not when aiohttp writes it.
+        for body in (bytearray(b'p'), memoryview(b'p'), 1):
+            try:
+                self.res.push(body)
+            except TypeError:
+                pass
+            else:
+                assert False
+        assert self.res.length == 8197
+
+    @aiotest
+    async def test_stream(self):
+        async def later(chunk):
+            return chunk
+
+        assert self.res.stream([b'foo', later('bar'), b'']) is self.res
+        assert isinstance(self.res.body, Stream)
+        assert (await self.res.body.read()) == b'foo'
+        assert (await self.res.body.read()) == b'bar'
+        assert (await self.res.body.read()) is None
+
+        stream = Stream(iter(['foo', later(b'bar')]))
+        await stream.prime()
+        chunks = []
+        for future in stream:
+            chunks.append((await future))
+        assert chunks == [b'foo', b'bar']
+
+        async def source():
+            yield 'foo'
+            yield b''
+            yield b'bar'
+
+        stream = Stream(source())
+        assert (await stream.read()) == b'foo'
+        assert (await stream.read()) == b'bar'
+        assert (await stream.read()) is None
 
     def test_hook(self):
         assert self.res.hook(lambda res: res) is self.res
@@ -68,11 +104,22 @@ class TestRes:
 
     def test_ok(self):
         assert self.res.done is False
-        result = self.res.header('X-Test', 'test too').ok()
+        result = self.res.header('X-Test', 'test too').push('ok').ok()
         assert self.res.done is True
+        assert self.res.headers['Content-Length'] == '2'
         assert isinstance(result, Result)
         assert self.res.ok(True).ok()
 
+    def test_content_length(self):
+        for code in (101, 204, 304):
+            res = Response(lambda status, headers: None).status(code)
+            res.ok()
+            assert 'Content-Length' not in res.headers
+
+        res = Response(start_response).header('content-length', '5')
+        res.push('ok').ok()
+        assert res.headers == {'content-length': '5'}
+
     def test_err(self):
         assert self.res.err(True).err()
         try:
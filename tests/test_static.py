@@ -0,0 +1,198 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+from asyncio import get_event_loop, open_connection, start_server
+from tempfile import mkdtemp
+from shutil import rmtree
+import os
+
+from isperdal import Node as u
+from isperdal.adapter import AioHTTPServer
+from isperdal.request import Request
+from isperdal.response import Response
+from isperdal.static import static, FileStream
+from isperdal.utils import aiotest, Err
+
+env = {
+    'REQUEST_METHOD': "GET",
+    'PATH_INFO': "/",
+}
+
+
+def start_response(res_status, headers):
+    assert isinstance(res_status, str)
+
+
+class TestStatic:
+    def setUp(self):
+        self.root = mkdtemp()
+        with open(os.path.join(self.root, 'test.txt'), 'wb') as fd:
+            fd.write(b'0123456789')
+        open(os.path.join(self.root, 'empty.txt'), 'wb').close()
+        self.handle = static(self.root)
+
+    def tearDown(self):
+        os.remove(os.path.join(self.root, 'test.txt'))
+        os.remove(os.path.join(self.root, 'empty.txt'))
+        os.rmdir(self.root)
+
+    def request(self, path, **headers):
+        req = Request(dict(env, **headers))
+        req._rest['path'] = path
+        return req, Response(start_response)
+
+    async def read(self, stream):
+        chunks = []
+        while True:
+            chunk = await stream.read()
+            if chunk is None:
+                return b''.join(chunks)
+            chunks.append(chunk)
+
+    @aiotest
+    async def test_get(self):
+        req, res = self.request('test.txt')
+        assert (await self.handle(None, req, res))
+        assert res.headers['Content-Length'] == '10'
+        assert res.headers['Content-Type'] == 'text/plain'
+        assert isinstance(res.body, FileStream)
+        assert (await self.read(res.body)) == b'0123456789'
+
+    @aiotest
+    async def test_not_found(self):
+        for path in ('missing.txt', '../test.txt', '', '%2e%2e/test.txt'):
+            req, res = self.request(path)
+            result = await self.handle(None, req, res)
+            assert isinstance(result, Err)
+            assert res.status_code == 404
+
+    @aiotest
+    async def test_empty(self):
+        req, res = self.request('empty.txt')
+        assert (await self.handle(None, req, res))
+        assert res.headers['Content-Length'] == '0'
+        assert (await self.read(res.body)) == b''
+        # never reaches the loop or the transport.
+        assert (await res.body.sendfile(None, None))
+
+    @aiotest
+    async def test_not_modified(self):
+        req, res = self.request('test.txt')
+        await self.handle(None, req, res)
+
+        req, res = self.request(
+            'test.txt', HTTP_IF_NONE_MATCH=res.headers['ETag']
+        )
+        assert (await self.handle(None, req, res))
+        assert res.status_code == 304
+        assert not res.body
+
+    @aiotest
+    async def test_range(self):
+        req, res = self.request('test.txt', HTTP_RANGE="bytes=2-4")
+        assert (await self.handle(None, req, res))
+        assert res.status_code == 206
+        assert res.headers['Content-Range'] == 'bytes 2-4/10'
+        assert (await self.read(res.body)) == b'234'
+
+        req, res = self.request('test.txt', HTTP_RANGE="bytes=20-")
+        assert (await self.handle(None, req, res))
+        assert res.status_code == 416
+
+        req, res = self.request('test.txt', HTTP_RANGE="bytes=0-1,4-5")
+        assert (await self.handle(None, req, res))
+        assert res.status_code == 0
+
+
+class plainLoop:
+    """
+    Loop without `sendfile`, eg: Python 3.6-.
+    """
+
+    def __init__(self, loop):
+        self.loop = loop
+
+    def __getattr__(self, name):
+        if name == 'sendfile':
+            raise AttributeError(name)
+        return getattr(self.loop, name)
+
+
+async def fetch(address, uri, *headers):
+    reader, writer = await open_connection(*address)
+    writer.write("GET {} HTTP/1.1\r\n{}Connection: close\r\n\r\n".format(
+        uri, "".join(header + "\r\n" for header in headers)
+    ).encode())
+    data = await reader.read()
+    writer.close()
+
+    head, _, body = data.partition(b"\r\n\r\n")
+    status, *lines = head.decode().split("\r\n")
+    return status, dict(
+        (name.lower(), value)
+        for name, value in (line.split(": ", 1) for line in lines)
+    ), body
+
+
+class TestSend:
+    def setUp(self):
+        self.root = mkdtemp()
+        self.data = os.urandom(3 << 20)
+        self.path = os.path.join(self.root, 'big.bin')
+        with open(self.path, 'wb') as fd:
+            fd.write(self.data)
+
+    def tearDown(self):
+        rmtree(self.root)
+
+    async def serve(self, native):
+        server = AioHTTPServer(
+            '127.0.0.1', 0, False, None, grace=0, native=native
+        )
+        root = u('/').append([u('static/'), u(':!path')])(static(self.root))
+        srv, connections = await server.start(root)
+        address = srv.sockets[0].getsockname()[:2]
+        try:
+            status, headers, body = await fetch(address, "/static/big.bin")
+            assert status == "HTTP/1.1 200 OK"
+            assert headers['content-length'] == str(len(self.data))
+            assert body == self.data
+
+            status, headers, body = await fetch(
+                address, "/static/big.bin", "Range: bytes=1048570-2097159"
+            )
+            assert status == "HTTP/1.1 206 Partial Content"
+            assert headers['content-range'] == \
+                "bytes 1048570-2097159/{}".format(len(self.data))
+            assert body == self.data[1048570:2097160]
+        finally:
+            await server.close(srv, connections)
+
+    @aiotest
+    async def test_native(self):
+        # zero-copy, `loop.sendfile` or `os.sendfile`.
+        await self.serve(True)
+
+    @aiotest
+    async def test_wsgi(self):
+        # mmap chunks.
+        await self.serve(False)
+
+    @aiotest
+    async def test_sendfile(self):
+        loop = get_event_loop()
+        for target in (loop, plainLoop(loop)):
+            async def send(reader, writer):
+                assert (await FileStream(
+                    self.path, 10, len(self.data) - 20
+                ).sendfile(writer, target))
+                writer.close()
+
+            server = await start_server(send, '127.0.0.1', 0)
+            reader, writer = await open_connection(
+                *server.sockets[0].getsockname()[:2]
+            )
+            assert (await reader.read()) == self.data[10:-10]
+            writer.close()
+            server.close()
+            await server.wait_closed()
@@ -1,8 +1,6 @@
 #!/usr/bin/env python
 # encoding: utf-8
 
-from asyncio import coroutine
-
 from aiohttp.websocket import (
     MSG_PING,
     MSG_TEXT,
@@ -31,8 +29,7 @@ class fakeWsqueue:
     }), [MSG_PING, MSG_TEXT, MSG_BINARY, MSG_CLOSE]))
     num = 0
 
-    @coroutine
-    def read(self):
+    async def read(self):
         self.num += 1
         return self.event[self.num-1]
 
@@ -55,7 +52,7 @@ class fakeReq:
 
 
 class fakeRes:
-    hook = []
+    hooks = []
     status_code = 0
     headers = {}
 
@@ -65,25 +62,20 @@ class fakeRes:
 
 
 class WS(WebSocket):
-    @coroutine
-    def on_handshake(self):
-        yield from super().on_handshake()
+    async def on_handshake(self):
+        await super().on_handshake()
 
-    @coroutine
-    def on_connect(self):
+    async def on_connect(self):
         assert True
 
-    @coroutine
-    def on_ping(self):
+    async def on_ping(self):
         self.pong()
 
-    @coroutine
-    def on_message(self, message):
+    async def on_message(self, message):
         assert message == "MSG"
         self.send(message)
 
-    @coroutine
-    def on_close(self):
+    async def on_close(self):
         self.close()
 
 
@@ -93,5 +85,5 @@ class TestWs:
         self.ws = WS(None, self.req, self.res)
 
     @aiotest
-    def test_call(self):
-        yield from self.ws()
+    async def test_call(self):
+        await self.ws()